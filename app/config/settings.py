@@ -15,6 +15,28 @@ class Settings(BaseSettings):
     app_env: str = "prod"  # dev, staging, prod
     log_level: str = "INFO"
 
+    # Sessão do banco (aplicado em cada conexão nova do pool)
+    # 'off' elimina a espera pelo flush do WAL no commit (ganho de latência em escrita),
+    # ao custo de poder perder os últimos commits se o servidor cair. Padrão seguro: 'on'.
+    db_synchronous_commit: str = "on"
+    # Teto por instrução (ms; 0 = sem limite): uma consulta presa não segura a conexão
+    # do pool indefinidamente. As tools são OLTP curtas, bem abaixo disso.
+    db_statement_timeout_ms: int = 10000
+    # JIT do Postgres: a compilação custa mais que a execução em consultas curtas
+    db_jit: bool = False
+
+    # Pool de conexões (Supabase limita conexões por projeto — ajuste por ambiente)
+    db_pool_min_size: int = 1    # conexões sempre abertas (evita handshake na 1ª chamada)
+    db_pool_max_size: int = 20   # teto de conversas simultâneas
+    db_pool_max_idle: int = 300  # segundos ociosa antes de fechar conexões acima do mínimo
+    # Prepared statements server-side (psycopg prepara após N execuções da mesma query).
+    # Desligue (False) se DATABASE_URL apontar para um pooler em modo transação
+    # (ex.: Supabase porta 6543), que não suporta prepared statements.
+    db_prepared_statements: bool = True
+    # Execuções da mesma query (por conexão) antes de prepará-la. As tools repetem um
+    # conjunto pequeno e fixo de SQL, então preparar já na 2ª execução compensa.
+    db_prepare_threshold: int = 1
+
     class Config:
         # Lê automaticamente do arquivo .env local
         env_file = ".env"
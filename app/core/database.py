@@ -1,7 +1,30 @@
 # app/core/database.py
+import psycopg
 from psycopg_pool import ConnectionPool
 from app.config.settings import settings
 
+
+def _configure_connection(conn: psycopg.Connection) -> None:
+    """
+    Aplica parâmetros de sessão uma única vez, quando o pool abre a conexão.
+    As conexões são reaproveitadas, então o custo não se repete a cada tool call.
+    """
+    conn.execute(
+        """
+        SELECT set_config('synchronous_commit', %s, false),
+               set_config('statement_timeout', %s, false),
+               set_config('jit', %s, false)
+        """,
+        (
+            settings.db_synchronous_commit,
+            str(settings.db_statement_timeout_ms),
+            "on" if settings.db_jit else "off",
+        ),
+    )
+    # O pool exige a conexão ociosa (fora de transação) ao final do configure
+    conn.commit()
+
+
 class Database:
     """
     Gerenciador Singleton de Pool de Conexões.
@@ -21,10 +44,24 @@ class Database:
             # Cria o pool
             cls._pool = ConnectionPool(
                 conninfo=db_url,
-                min_size=1,  # Sempre mantém 1 conexão viva
-                max_size=20, # Aguenta até 20 conversas simultâneas
+                min_size=settings.db_pool_min_size,  # Conexões sempre vivas
+                max_size=settings.db_pool_max_size,  # Conversas simultâneas
+                max_idle=settings.db_pool_max_idle,  # Devolve ao banco o excedente ocioso
                 timeout=30,  # Espera 30s por uma conexão livre
-                name="wf_milhas_pool"
+                # psycopg prepara automaticamente a query após N execuções na mesma conexão
+                # (settings.db_prepare_threshold); None desliga (necessário atrás de pooler
+                # em modo transação)
+                kwargs={
+                    "prepare_threshold": (
+                        settings.db_prepare_threshold if settings.db_prepared_statements else None
+                    ),
+                },
+                configure=_configure_connection,
+                name="wf_milhas_pool",
+                # Abre já no import: as conexões mínimas são criadas em background
+                # (sem bloquear a inicialização) e o pool segue reconectando sozinho
+                # se o banco estiver indisponível.
+                open=True,
             )
             print("✅ Database Connection Pool inicializado.")
 
@@ -1,5 +1,7 @@
 import json
 import logging
+import logging.handlers
+import queue
 from datetime import datetime, timezone
 
 _STDLIB_KEYS = {
@@ -15,7 +17,8 @@ class JsonFormatter(logging.Formatter):
 
     def format(self, record: logging.LogRecord) -> str:
         data: dict = {
-            "ts": datetime.now(timezone.utc).isoformat(),
+            # Instante de criação do record (a escrita pode ocorrer depois, via fila)
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(),
             "level": record.levelname,
             "logger": record.name,
             "msg": record.getMessage(),
@@ -28,8 +31,29 @@ class JsonFormatter(logging.Formatter):
         return json.dumps(data, ensure_ascii=False)
 
 
+class _InProcessQueueHandler(logging.handlers.QueueHandler):
+    """
+    QueueHandler para fila em memória (mesmo processo).
+    O prepare() padrão formata o record e descarta exc_info; aqui só resolvemos
+    a mensagem e mantemos exc_info/extras para o JsonFormatter do listener.
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        record.msg = record.getMessage()
+        record.args = None
+        return record
+
+
+_listener: logging.handlers.QueueListener | None = None
+
+
 def setup_logging(app_env: str, log_level: str) -> None:
-    """Configura o logging raiz. Deve ser chamado uma única vez na inicialização."""
+    """
+    Configura o logging raiz. Deve ser chamado uma única vez na inicialização.
+    A emissão é assíncrona: quem loga só enfileira o record (put_nowait) e uma
+    thread do QueueListener formata e escreve no stream, fora do caminho quente.
+    """
+    global _listener
     handler = logging.StreamHandler()
     if app_env != "dev":
         handler.setFormatter(JsonFormatter())
@@ -37,6 +61,20 @@ def setup_logging(app_env: str, log_level: str) -> None:
         handler.setFormatter(
             logging.Formatter("%(asctime)s [%(levelname)s] %(name)s: %(message)s")
         )
+    if _listener is not None:
+        _listener.stop()
+    log_queue: queue.Queue = queue.Queue(-1)
+    _listener = logging.handlers.QueueListener(log_queue, handler, respect_handler_level=True)
+    _listener.start()
+
     root = logging.getLogger()
     root.setLevel(log_level)
-    root.handlers = [handler]
+    root.handlers = [_InProcessQueueHandler(log_queue)]
+
+
+def shutdown_logging() -> None:
+    """Esvazia a fila e para o listener. Chamar no shutdown do app."""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
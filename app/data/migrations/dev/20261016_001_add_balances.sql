@@ -0,0 +1,82 @@
+-- ============================================================
+-- MIGRATION: Tabela balances mantida por trigger
+-- Data: 2026-10-16
+-- Descrição: Saldo agregado por (conta, programa) mantido incrementalmente
+--            por trigger em transactions (INSERT/UPDATE/DELETE). O extrato
+--            (get_dashboard) passa a ler N programas em vez de somar todas
+--            as transações da conta a cada chamada.
+-- ⚠️ ATENÇÃO: O backfill roda sob LOCK em transactions para não contar
+--             duas vezes escritas concorrentes. Executar fora de horário de pico.
+-- ============================================================
+
+BEGIN;
+
+-- 1. Tabela de saldos
+CREATE TABLE IF NOT EXISTS balances (
+    account_id   UUID           NOT NULL REFERENCES accounts(id) ON DELETE CASCADE,
+    programa_id  UUID           NOT NULL REFERENCES programs(id),
+    total_milhas BIGINT         NOT NULL DEFAULT 0,
+    total_custo  NUMERIC(15, 2) NOT NULL DEFAULT 0,
+    updated_at   TIMESTAMPTZ    DEFAULT (NOW() AT TIME ZONE 'America/Sao_Paulo'),
+    PRIMARY KEY (account_id, programa_id)
+);
+ALTER TABLE balances ENABLE ROW LEVEL SECURITY;
+
+-- 2. Função de manutenção incremental
+CREATE OR REPLACE FUNCTION fn_maintain_balances()
+RETURNS TRIGGER AS $$
+BEGIN
+    IF TG_OP IN ('UPDATE', 'DELETE') THEN
+        UPDATE balances
+        SET total_milhas = total_milhas - OLD.milhas_creditadas,
+            total_custo  = total_custo  - OLD.custo_total,
+            updated_at   = NOW() AT TIME ZONE 'America/Sao_Paulo'
+        WHERE account_id = OLD.account_id AND programa_id = OLD.companhia_referencia_id;
+    END IF;
+    IF TG_OP IN ('INSERT', 'UPDATE') THEN
+        INSERT INTO balances (account_id, programa_id, total_milhas, total_custo)
+        VALUES (NEW.account_id, NEW.companhia_referencia_id, NEW.milhas_creditadas, NEW.custo_total)
+        ON CONFLICT (account_id, programa_id) DO UPDATE
+        SET total_milhas = balances.total_milhas + EXCLUDED.total_milhas,
+            total_custo  = balances.total_custo  + EXCLUDED.total_custo,
+            updated_at   = NOW() AT TIME ZONE 'America/Sao_Paulo';
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+-- 3. Backfill + trigger sob o mesmo lock (nenhuma escrita escapa entre os dois)
+LOCK TABLE transactions IN SHARE ROW EXCLUSIVE MODE;
+
+INSERT INTO balances (account_id, programa_id, total_milhas, total_custo)
+SELECT account_id, companhia_referencia_id, SUM(milhas_creditadas), SUM(custo_total)
+FROM transactions
+GROUP BY account_id, companhia_referencia_id
+ON CONFLICT (account_id, programa_id) DO UPDATE
+SET total_milhas = EXCLUDED.total_milhas,
+    total_custo  = EXCLUDED.total_custo;
+
+DROP TRIGGER IF EXISTS trg_maintain_balances ON transactions;
+CREATE TRIGGER trg_maintain_balances
+    AFTER INSERT OR DELETE OR UPDATE OF account_id, companhia_referencia_id, milhas_creditadas, custo_total
+    ON transactions
+    FOR EACH ROW EXECUTE FUNCTION fn_maintain_balances();
+
+COMMENT ON TABLE balances IS 'Saldo agregado por conta/programa. Mantido pelo trigger trg_maintain_balances; não escrever manualmente.';
+
+-- Verificação final (deve retornar 0 linhas divergentes)
+SELECT COUNT(*) AS divergencias_deve_ser_0
+FROM (
+    SELECT account_id, companhia_referencia_id AS programa_id,
+           SUM(milhas_creditadas) AS m, SUM(custo_total) AS c
+    FROM transactions
+    GROUP BY 1, 2
+) t
+FULL JOIN balances b USING (account_id, programa_id)
+WHERE t.m IS DISTINCT FROM b.total_milhas OR t.c IS DISTINCT FROM b.total_custo;
+
+INSERT INTO schema_migrations (version, description)
+VALUES ('20261016_001_add_balances', 'Tabela balances (saldo por conta/programa) mantida por trigger em transactions')
+ON CONFLICT DO NOTHING;
+
+COMMIT;
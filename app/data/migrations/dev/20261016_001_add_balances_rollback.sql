@@ -0,0 +1,10 @@
+-- ============================================================
+-- ROLLBACK: 20261016_001_add_balances
+-- Desfaz: tabela balances, trigger trg_maintain_balances e função fn_maintain_balances
+-- ============================================================
+
+DROP TRIGGER IF EXISTS trg_maintain_balances ON transactions;
+DROP FUNCTION IF EXISTS fn_maintain_balances();
+DROP TABLE IF EXISTS balances;
+
+DELETE FROM schema_migrations WHERE version = '20261016_001_add_balances';
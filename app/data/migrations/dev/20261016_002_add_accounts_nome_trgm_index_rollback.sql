@@ -0,0 +1,8 @@
+-- ============================================================
+-- ROLLBACK: 20261016_002_add_accounts_nome_trgm_index
+-- Desfaz: índice idx_accounts_nome_trgm (a extensão pg_trgm é mantida)
+-- ============================================================
+
+DROP INDEX IF EXISTS idx_accounts_nome_trgm;
+
+DELETE FROM schema_migrations WHERE version = '20261016_002_add_accounts_nome_trgm_index';
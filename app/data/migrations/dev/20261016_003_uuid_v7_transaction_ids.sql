@@ -0,0 +1,34 @@
+-- ============================================================
+-- MIGRATION: IDs UUIDv7 (ordenados por tempo) em transactions e transaction_batches
+-- Data: 2026-10-16
+-- Descrição: gen_random_uuid() gera UUIDv4 aleatório: cada INSERT cai numa página
+--            aleatória do índice de PK. UUIDv7 começa com o timestamp em ms, então
+--            novas linhas são anexadas ao fim da B-tree (localidade de escrita).
+--            O tipo da coluna continua UUID — nada muda para quem referencia os IDs.
+--            Linhas existentes mantêm seus IDs.
+-- ============================================================
+
+CREATE OR REPLACE FUNCTION uuid_generate_v7()
+RETURNS UUID AS $$
+    -- 48 bits de timestamp Unix em ms + bits aleatórios do gen_random_uuid();
+    -- os set_bit ajustam o nibble de versão de 4 para 7 (variante RFC 4122 preservada).
+    SELECT encode(
+        set_bit(
+            set_bit(
+                overlay(uuid_send(gen_random_uuid())
+                        PLACING substring(int8send(floor(extract(epoch FROM clock_timestamp()) * 1000)::BIGINT) FROM 3)
+                        FROM 1 FOR 6),
+                52, 1),
+            53, 1),
+        'hex')::UUID;
+$$ LANGUAGE sql VOLATILE;
+
+ALTER TABLE transactions        ALTER COLUMN id SET DEFAULT uuid_generate_v7();
+ALTER TABLE transaction_batches ALTER COLUMN id SET DEFAULT uuid_generate_v7();
+
+-- Verificação final (versão deve ser 7)
+SELECT substring(uuid_generate_v7()::TEXT FROM 15 FOR 1) AS versao_deve_ser_7;
+
+INSERT INTO schema_migrations (version, description)
+VALUES ('20261016_003_uuid_v7_transaction_ids', 'Default UUIDv7 (ordenado por tempo) para transactions e transaction_batches')
+ON CONFLICT DO NOTHING;
@@ -0,0 +1,10 @@
+-- ============================================================
+-- ROLLBACK: 20261016_003_uuid_v7_transaction_ids
+-- Desfaz: default UUIDv7 em transactions/transaction_batches e função uuid_generate_v7
+-- ============================================================
+
+ALTER TABLE transactions        ALTER COLUMN id SET DEFAULT gen_random_uuid();
+ALTER TABLE transaction_batches ALTER COLUMN id SET DEFAULT gen_random_uuid();
+DROP FUNCTION IF EXISTS uuid_generate_v7();
+
+DELETE FROM schema_migrations WHERE version = '20261016_003_uuid_v7_transaction_ids';
@@ -0,0 +1,44 @@
+-- ============================================================
+-- MIGRATION: Índice único de CPF normalizado (só dígitos) em accounts
+-- Data: 2026-10-16
+-- Descrição: _get_account_id e create_account comparam
+--            regexp_replace(cpf, '\D', '', 'g') = %s. Nenhum índice casava com a
+--            expressão (accounts_cpf_key indexa o texto bruto, com pontuação),
+--            então toda busca por CPF era seq scan em accounts. O índice de
+--            expressão é UNIQUE: além de servir as buscas, é o árbitro de
+--            INSERT ... ON CONFLICT em create_account — checagem de duplicidade
+--            e inserção viram uma única instrução atômica (sem corrida).
+-- ⚠️ ATENÇÃO: Se existirem CPFs iguais com pontuação diferente, a migration é
+--             abortada (RAISE EXCEPTION) sem alterar nada. Listar as duplicatas com:
+--             SELECT regexp_replace(cpf, '\D', '', 'g'), COUNT(*) FROM accounts
+--             GROUP BY 1 HAVING COUNT(*) > 1;
+-- ============================================================
+
+BEGIN;
+
+-- 1. Conferência prévia: aborta se houver CPFs duplicados após normalização
+DO $$
+BEGIN
+    IF EXISTS (
+        SELECT 1 FROM accounts
+        GROUP BY regexp_replace(cpf, '\D', '', 'g')
+        HAVING COUNT(*) > 1
+    ) THEN
+        RAISE EXCEPTION 'CPFs duplicados (mesmos dígitos) em accounts: unificar as contas antes de criar idx_accounts_cpf_digits_key';
+    END IF;
+END $$;
+
+-- 2. Índice único de expressão
+CREATE UNIQUE INDEX IF NOT EXISTS idx_accounts_cpf_digits_key
+    ON accounts ((regexp_replace(cpf, '\D', '', 'g')));
+
+-- Verificação final
+SELECT
+    (SELECT COUNT(*) FROM pg_indexes
+     WHERE tablename = 'accounts' AND indexname = 'idx_accounts_cpf_digits_key') AS indice_deve_ser_1;
+
+INSERT INTO schema_migrations (version, description)
+VALUES ('20261016_004_unique_accounts_cpf_digits', 'Índice único de CPF normalizado; árbitro do ON CONFLICT em create_account')
+ON CONFLICT DO NOTHING;
+
+COMMIT;
@@ -0,0 +1,8 @@
+-- ============================================================
+-- ROLLBACK: 20261016_004_unique_accounts_cpf_digits
+-- Desfaz: índice único idx_accounts_cpf_digits_key
+-- ============================================================
+
+DROP INDEX IF EXISTS idx_accounts_cpf_digits_key;
+
+DELETE FROM schema_migrations WHERE version = '20261016_004_unique_accounts_cpf_digits';
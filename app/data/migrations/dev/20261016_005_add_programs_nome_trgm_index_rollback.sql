@@ -0,0 +1,8 @@
+-- ============================================================
+-- ROLLBACK: 20261016_005_add_programs_nome_trgm_index
+-- Desfaz: índice trigram idx_programs_nome_trgm
+-- ============================================================
+
+DROP INDEX IF EXISTS idx_programs_nome_trgm;
+
+DELETE FROM schema_migrations WHERE version = '20261016_005_add_programs_nome_trgm_index';
@@ -0,0 +1,8 @@
+-- ============================================================
+-- ROLLBACK: 20261016_006_covering_transactions_account_programa_index
+-- Desfaz: índice de cobertura idx_transactions_acc_prog_created
+-- ============================================================
+
+DROP INDEX IF EXISTS idx_transactions_acc_prog_created;
+
+DELETE FROM schema_migrations WHERE version = '20261016_006_covering_transactions_account_programa_index';
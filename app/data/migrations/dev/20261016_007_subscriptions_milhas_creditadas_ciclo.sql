@@ -0,0 +1,63 @@
+-- ============================================================
+-- MIGRATION: Contador de milhas creditadas por assinatura (trigger)
+-- Data: 2026-10-16
+-- Descrição: Adiciona subscriptions.milhas_creditadas_ciclo, mantido por trigger em
+--            transactions (INSERT/UPDATE/DELETE de transações vinculadas a assinatura).
+--            A trava de segurança de process_monthly_credit lê o contador da própria
+--            assinatura em vez de somar todo o histórico de créditos a cada chamada.
+-- ⚠️ ATENÇÃO: O backfill roda sob LOCK em transactions para não contar
+--             duas vezes escritas concorrentes. Executar fora de horário de pico.
+-- ============================================================
+
+BEGIN;
+
+-- 1. Coluna do contador
+ALTER TABLE subscriptions
+    ADD COLUMN IF NOT EXISTS milhas_creditadas_ciclo BIGINT NOT NULL DEFAULT 0;
+
+-- 2. Função de manutenção incremental
+CREATE OR REPLACE FUNCTION fn_maintain_subscription_credits()
+RETURNS TRIGGER AS $$
+BEGIN
+    IF TG_OP IN ('UPDATE', 'DELETE') AND OLD.subscription_id IS NOT NULL THEN
+        UPDATE subscriptions
+        SET milhas_creditadas_ciclo = milhas_creditadas_ciclo - OLD.milhas_creditadas
+        WHERE id = OLD.subscription_id;
+    END IF;
+    IF TG_OP IN ('INSERT', 'UPDATE') AND NEW.subscription_id IS NOT NULL THEN
+        UPDATE subscriptions
+        SET milhas_creditadas_ciclo = milhas_creditadas_ciclo + NEW.milhas_creditadas
+        WHERE id = NEW.subscription_id;
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+-- 3. Backfill + trigger sob o mesmo lock (nenhuma escrita escapa entre os dois)
+LOCK TABLE transactions IN SHARE ROW EXCLUSIVE MODE;
+
+UPDATE subscriptions s
+SET milhas_creditadas_ciclo = COALESCE((
+    SELECT SUM(t.milhas_creditadas) FROM transactions t WHERE t.subscription_id = s.id
+), 0);
+
+DROP TRIGGER IF EXISTS trg_maintain_subscription_credits ON transactions;
+CREATE TRIGGER trg_maintain_subscription_credits
+    AFTER INSERT OR DELETE OR UPDATE OF subscription_id, milhas_creditadas
+    ON transactions
+    FOR EACH ROW EXECUTE FUNCTION fn_maintain_subscription_credits();
+
+COMMENT ON COLUMN subscriptions.milhas_creditadas_ciclo IS 'Soma de milhas_creditadas das transações vinculadas. Mantido pelo trigger trg_maintain_subscription_credits; não escrever manualmente.';
+
+-- Verificação final (deve retornar 0)
+SELECT COUNT(*) AS divergencias_deve_ser_0
+FROM subscriptions s
+WHERE s.milhas_creditadas_ciclo IS DISTINCT FROM COALESCE((
+    SELECT SUM(t.milhas_creditadas) FROM transactions t WHERE t.subscription_id = s.id
+), 0);
+
+INSERT INTO schema_migrations (version, description)
+VALUES ('20261016_007_subscriptions_milhas_creditadas_ciclo', 'Contador subscriptions.milhas_creditadas_ciclo mantido por trigger em transactions')
+ON CONFLICT DO NOTHING;
+
+COMMIT;
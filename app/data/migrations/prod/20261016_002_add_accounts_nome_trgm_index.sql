@@ -0,0 +1,23 @@
+-- ============================================================
+-- MIGRATION: Índice trigram (pg_trgm) em accounts.nome
+-- Data: 2026-10-16
+-- Descrição: _get_account_id resolve nomes parciais com ILIKE '%fragmento%'.
+--            Com curinga à esquerda, B-tree não serve e a busca vira seq scan.
+--            O índice GIN trigram torna o ILIKE atual indexável, sem mudar a
+--            semântica de busca por fragmento (nenhuma alteração de código).
+-- ============================================================
+
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
+
+CREATE INDEX IF NOT EXISTS idx_accounts_nome_trgm
+    ON accounts USING gin (nome gin_trgm_ops);
+
+-- Verificação final
+SELECT
+    (SELECT COUNT(*) FROM pg_extension WHERE extname = 'pg_trgm') AS extensao_deve_ser_1,
+    (SELECT COUNT(*) FROM pg_indexes
+     WHERE tablename = 'accounts' AND indexname = 'idx_accounts_nome_trgm') AS indice_deve_ser_1;
+
+INSERT INTO schema_migrations (version, description)
+VALUES ('20261016_002_add_accounts_nome_trgm_index', 'Índice GIN trigram em accounts.nome para buscas ILIKE por fragmento')
+ON CONFLICT DO NOTHING;
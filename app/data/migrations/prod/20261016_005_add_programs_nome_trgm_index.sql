@@ -0,0 +1,22 @@
+-- ============================================================
+-- MIGRATION: Índice trigram (pg_trgm) em programs.nome
+-- Data: 2026-10-16
+-- Descrição: _get_program_ids resolve nomes de programa com ILIKE '%fragmento%',
+--            o mesmo padrão já indexado em accounts.nome (migration 002). O índice
+--            GIN trigram torna essa busca indexável; o UNIQUE de programs.nome
+--            (B-tree) não serve para curinga à esquerda. Sem alteração de código.
+-- ============================================================
+
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
+
+CREATE INDEX IF NOT EXISTS idx_programs_nome_trgm
+    ON programs USING gin (nome gin_trgm_ops);
+
+-- Verificação final
+SELECT
+    (SELECT COUNT(*) FROM pg_indexes
+     WHERE tablename = 'programs' AND indexname = 'idx_programs_nome_trgm') AS indice_deve_ser_1;
+
+INSERT INTO schema_migrations (version, description)
+VALUES ('20261016_005_add_programs_nome_trgm_index', 'Índice GIN trigram em programs.nome para buscas ILIKE por fragmento')
+ON CONFLICT DO NOTHING;
@@ -0,0 +1,26 @@
+-- ============================================================
+-- MIGRATION: Índice de cobertura em transactions (conta, programa, created_at)
+-- Data: 2026-10-16
+-- Descrição: As leituras de transações por programa (_get_cpm_totals, confirmação
+--            de checkpoint e ajuste de CPM, get_client_panorama, delete_last_transaction)
+--            filtram por conta E programa. O índice (account_id, companhia_referencia_id,
+--            created_at DESC) com INCLUDE das colunas agregadas resolve os dois predicados
+--            numa única busca e atende, por index-only scan, o delta pós-checkpoint e a
+--            prévia da última transação. (O extrato, get_dashboard, lê a tabela balances.)
+-- ============================================================
+
+CREATE INDEX IF NOT EXISTS idx_transactions_acc_prog_created
+    ON transactions (account_id, companhia_referencia_id, created_at DESC)
+    INCLUDE (milhas_creditadas, custo_total, subscription_id, modo_aquisicao, data_transacao);
+
+-- Estatísticas atualizadas para o planner considerar o novo índice
+ANALYZE transactions;
+
+-- Verificação final
+SELECT
+    (SELECT COUNT(*) FROM pg_indexes
+     WHERE tablename = 'transactions' AND indexname = 'idx_transactions_acc_prog_created') AS indice_deve_ser_1;
+
+INSERT INTO schema_migrations (version, description)
+VALUES ('20261016_006_covering_transactions_account_programa_index', 'Índice de cobertura (conta, programa, created_at DESC) em transactions')
+ON CONFLICT DO NOTHING;
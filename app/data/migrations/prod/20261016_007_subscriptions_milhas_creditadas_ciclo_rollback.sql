@@ -0,0 +1,10 @@
+-- ============================================================
+-- ROLLBACK: 20261016_007_subscriptions_milhas_creditadas_ciclo
+-- Desfaz: coluna milhas_creditadas_ciclo, trigger e função de manutenção
+-- ============================================================
+
+DROP TRIGGER IF EXISTS trg_maintain_subscription_credits ON transactions;
+DROP FUNCTION IF EXISTS fn_maintain_subscription_credits();
+ALTER TABLE subscriptions DROP COLUMN IF EXISTS milhas_creditadas_ciclo;
+
+DELETE FROM schema_migrations WHERE version = '20261016_007_subscriptions_milhas_creditadas_ciclo';
@@ -0,0 +1,26 @@
+-- ============================================================
+-- MIGRATION: Índice do último checkpoint em cpm_checkpoints (conta, programa, created_at)
+-- Data: 2026-10-16
+-- Descrição: Substitui idx_cpm_checkpoints_account_programa por (account_id, programa_id,
+--            created_at DESC). A busca do último checkpoint (_get_cpm_totals, panorama,
+--            prévia de deleção) passa a ler 1 entrada do índice, sem ordenar os checkpoints
+--            do programa. O prefixo (account_id, programa_id) cobre tudo que o índice antigo
+--            atendia. O fechamento mensal já é servido por idx_cpm_checkpoints_mensal_unico.
+-- ============================================================
+
+CREATE INDEX IF NOT EXISTS idx_cpm_checkpoints_acc_prog_created
+    ON cpm_checkpoints (account_id, programa_id, created_at DESC);
+
+DROP INDEX IF EXISTS idx_cpm_checkpoints_account_programa;
+
+-- Estatísticas atualizadas para o planner considerar o novo índice
+ANALYZE cpm_checkpoints;
+
+-- Verificação final
+SELECT
+    (SELECT COUNT(*) FROM pg_indexes
+     WHERE tablename = 'cpm_checkpoints' AND indexname = 'idx_cpm_checkpoints_acc_prog_created') AS indice_deve_ser_1;
+
+INSERT INTO schema_migrations (version, description)
+VALUES ('20261016_008_cpm_checkpoints_latest_index', 'Índice (conta, programa, created_at DESC) em cpm_checkpoints')
+ON CONFLICT DO NOTHING;
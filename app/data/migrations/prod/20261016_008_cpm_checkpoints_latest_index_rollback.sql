@@ -0,0 +1,11 @@
+-- ============================================================
+-- ROLLBACK: 20261016_008_cpm_checkpoints_latest_index
+-- Desfaz: índice idx_cpm_checkpoints_acc_prog_created (recria o índice original de cpm_checkpoints)
+-- ============================================================
+
+CREATE INDEX IF NOT EXISTS idx_cpm_checkpoints_account_programa
+    ON cpm_checkpoints (account_id, programa_id);
+
+DROP INDEX IF EXISTS idx_cpm_checkpoints_acc_prog_created;
+
+DELETE FROM schema_migrations WHERE version = '20261016_008_cpm_checkpoints_latest_index';
@@ -19,6 +19,12 @@
 
 SET timezone = 'America/Sao_Paulo';
 
+-- --------------------------------------------------------
+-- EXTENSÕES
+-- --------------------------------------------------------
+
+CREATE EXTENSION IF NOT EXISTS pg_trgm; -- índices trigram para buscas ILIKE '%x%'
+
 -- --------------------------------------------------------
 -- FUNÇÕES
 -- --------------------------------------------------------
@@ -31,6 +37,20 @@ BEGIN
 END;
 $$ LANGUAGE plpgsql;
 
+-- UUIDv7: prefixo de timestamp em ms → inserts sequenciais na B-tree da PK
+CREATE OR REPLACE FUNCTION uuid_generate_v7()
+RETURNS UUID AS $$
+    SELECT encode(
+        set_bit(
+            set_bit(
+                overlay(uuid_send(gen_random_uuid())
+                        PLACING substring(int8send(floor(extract(epoch FROM clock_timestamp()) * 1000)::BIGINT) FROM 3)
+                        FROM 1 FOR 6),
+                52, 1),
+            53, 1),
+        'hex')::UUID;
+$$ LANGUAGE sql VOLATILE;
+
 CREATE OR REPLACE FUNCTION fn_auto_disable_subscription()
 RETURNS TRIGGER AS $$
 BEGIN
@@ -41,6 +61,47 @@ BEGIN
 END;
 $$ LANGUAGE plpgsql;
 
+-- Mantém balances incrementalmente a cada escrita em transactions
+CREATE OR REPLACE FUNCTION fn_maintain_balances()
+RETURNS TRIGGER AS $$
+BEGIN
+    IF TG_OP IN ('UPDATE', 'DELETE') THEN
+        UPDATE balances
+        SET total_milhas = total_milhas - OLD.milhas_creditadas,
+            total_custo  = total_custo  - OLD.custo_total,
+            updated_at   = NOW() AT TIME ZONE 'America/Sao_Paulo'
+        WHERE account_id = OLD.account_id AND programa_id = OLD.companhia_referencia_id;
+    END IF;
+    IF TG_OP IN ('INSERT', 'UPDATE') THEN
+        INSERT INTO balances (account_id, programa_id, total_milhas, total_custo)
+        VALUES (NEW.account_id, NEW.companhia_referencia_id, NEW.milhas_creditadas, NEW.custo_total)
+        ON CONFLICT (account_id, programa_id) DO UPDATE
+        SET total_milhas = balances.total_milhas + EXCLUDED.total_milhas,
+            total_custo  = balances.total_custo  + EXCLUDED.total_custo,
+            updated_at   = NOW() AT TIME ZONE 'America/Sao_Paulo';
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Mantém subscriptions.milhas_creditadas_ciclo a cada escrita em transactions vinculadas
+CREATE OR REPLACE FUNCTION fn_maintain_subscription_credits()
+RETURNS TRIGGER AS $$
+BEGIN
+    IF TG_OP IN ('UPDATE', 'DELETE') AND OLD.subscription_id IS NOT NULL THEN
+        UPDATE subscriptions
+        SET milhas_creditadas_ciclo = milhas_creditadas_ciclo - OLD.milhas_creditadas
+        WHERE id = OLD.subscription_id;
+    END IF;
+    IF TG_OP IN ('INSERT', 'UPDATE') AND NEW.subscription_id IS NOT NULL THEN
+        UPDATE subscriptions
+        SET milhas_creditadas_ciclo = milhas_creditadas_ciclo + NEW.milhas_creditadas
+        WHERE id = NEW.subscription_id;
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
 -- --------------------------------------------------------
 -- TABELAS
 -- --------------------------------------------------------
@@ -72,6 +133,8 @@ CREATE TABLE IF NOT EXISTS subscriptions (
     programa_id             UUID           NOT NULL REFERENCES programs(id),
     valor_total_ciclo       NUMERIC(10, 2) NOT NULL CHECK (valor_total_ciclo > 0),
     milhas_garantidas_ciclo INTEGER        NOT NULL CHECK (milhas_garantidas_ciclo > 0),
+    -- Soma das milhas creditadas nas transações vinculadas (mantida por trigger)
+    milhas_creditadas_ciclo BIGINT         NOT NULL DEFAULT 0,
     -- CPM calculado automaticamente (coluna gerada, imutável)
     cpm_fixo     NUMERIC(10, 2) GENERATED ALWAYS AS (
         (valor_total_ciclo / milhas_garantidas_ciclo::NUMERIC) * 1000
@@ -90,7 +153,7 @@ CREATE TABLE IF NOT EXISTS subscriptions (
 
 -- 5. transactions
 CREATE TABLE IF NOT EXISTS transactions (
-    id                     UUID           PRIMARY KEY DEFAULT gen_random_uuid(),
+    id                     UUID           PRIMARY KEY DEFAULT uuid_generate_v7(),
     account_id             UUID           NOT NULL REFERENCES accounts(id),
     -- data_registro: quando foi lançado no sistema
     -- data_transacao: quando a transação realmente ocorreu
@@ -119,7 +182,7 @@ CREATE TABLE IF NOT EXISTS transactions (
 
 -- 5. transaction_batches
 CREATE TABLE IF NOT EXISTS transaction_batches (
-    id             UUID           PRIMARY KEY DEFAULT gen_random_uuid(),
+    id             UUID           PRIMARY KEY DEFAULT uuid_generate_v7(),
     transaction_id UUID           NOT NULL REFERENCES transactions(id) ON DELETE CASCADE,
     tipo           TEXT           CHECK (tipo IN ('ORGANICO', 'PAGO')),
     milhas_qtd     INTEGER        NOT NULL,
@@ -150,6 +213,18 @@ CREATE TABLE IF NOT EXISTS cpm_checkpoints (
     created_at            TIMESTAMPTZ    DEFAULT (NOW() AT TIME ZONE 'America/Sao_Paulo')
 );
 
+-- 7. balances
+-- Saldo agregado por conta/programa, mantido pelo trigger trg_maintain_balances.
+-- Evita re-somar todas as transações da conta a cada extrato.
+CREATE TABLE IF NOT EXISTS balances (
+    account_id   UUID           NOT NULL REFERENCES accounts(id) ON DELETE CASCADE,
+    programa_id  UUID           NOT NULL REFERENCES programs(id),
+    total_milhas BIGINT         NOT NULL DEFAULT 0,
+    total_custo  NUMERIC(15, 2) NOT NULL DEFAULT 0,
+    updated_at   TIMESTAMPTZ    DEFAULT (NOW() AT TIME ZONE 'America/Sao_Paulo'),
+    PRIMARY KEY (account_id, programa_id)
+);
+
 -- --------------------------------------------------------
 -- RASTREAMENTO DE MIGRATIONS
 -- --------------------------------------------------------
@@ -174,15 +249,30 @@ CREATE TRIGGER trg_maintain_consistency
     BEFORE INSERT OR UPDATE ON subscriptions
     FOR EACH ROW EXECUTE FUNCTION fn_auto_disable_subscription();
 
+-- Mantém balances sincronizado com transactions
+CREATE TRIGGER trg_maintain_balances
+    AFTER INSERT OR DELETE OR UPDATE OF account_id, companhia_referencia_id, milhas_creditadas, custo_total
+    ON transactions
+    FOR EACH ROW EXECUTE FUNCTION fn_maintain_balances();
+
+-- Mantém o contador de créditos das assinaturas
+CREATE TRIGGER trg_maintain_subscription_credits
+    AFTER INSERT OR DELETE OR UPDATE OF subscription_id, milhas_creditadas
+    ON transactions
+    FOR EACH ROW EXECUTE FUNCTION fn_maintain_subscription_credits();
+
 -- --------------------------------------------------------
 -- ÍNDICES
 -- --------------------------------------------------------
 
 -- accounts
 CREATE UNIQUE INDEX IF NOT EXISTS accounts_cpf_key ON accounts(cpf);
+CREATE INDEX IF NOT EXISTS idx_accounts_nome_trgm ON accounts USING gin (nome gin_trgm_ops);
+CREATE UNIQUE INDEX IF NOT EXISTS idx_accounts_cpf_digits_key ON accounts ((regexp_replace(cpf, '\D', '', 'g')));
 
 -- programs
 CREATE UNIQUE INDEX IF NOT EXISTS programs_nome_key ON programs(nome);
+CREATE INDEX IF NOT EXISTS idx_programs_nome_trgm ON programs USING gin (nome gin_trgm_ops);
 
 -- subscriptions
 CREATE INDEX IF NOT EXISTS idx_subs_account          ON subscriptions(account_id);
@@ -196,13 +286,16 @@ CREATE INDEX IF NOT EXISTS idx_transactions_origem_id              ON transactio
 CREATE INDEX IF NOT EXISTS idx_transactions_destino_id             ON transactions(destino_id);
 CREATE INDEX IF NOT EXISTS idx_transactions_companhia_referencia_id ON transactions(companhia_referencia_id);
 CREATE INDEX IF NOT EXISTS idx_transactions_subscription_id        ON transactions(subscription_id);
+CREATE INDEX IF NOT EXISTS idx_transactions_acc_prog_created
+    ON transactions(account_id, companhia_referencia_id, created_at DESC)
+    INCLUDE (milhas_creditadas, custo_total, subscription_id, modo_aquisicao, data_transacao);
 
 -- transaction_batches
 CREATE INDEX IF NOT EXISTS idx_transaction_batches_transaction_id ON transaction_batches(transaction_id);
 
 -- cpm_checkpoints
-CREATE INDEX IF NOT EXISTS idx_cpm_checkpoints_account_programa
-    ON cpm_checkpoints(account_id, programa_id);
+CREATE INDEX IF NOT EXISTS idx_cpm_checkpoints_acc_prog_created
+    ON cpm_checkpoints(account_id, programa_id, created_at DESC);
 CREATE UNIQUE INDEX IF NOT EXISTS idx_cpm_checkpoints_mensal_unico
     ON cpm_checkpoints(account_id, programa_id, periodo_referencia)
     WHERE periodo_referencia IS NOT NULL;
@@ -217,6 +310,7 @@ ALTER TABLE subscriptions       ENABLE ROW LEVEL SECURITY;
 ALTER TABLE transactions        ENABLE ROW LEVEL SECURITY;
 ALTER TABLE transaction_batches ENABLE ROW LEVEL SECURITY;
 ALTER TABLE cpm_checkpoints     ENABLE ROW LEVEL SECURITY;
+ALTER TABLE balances            ENABLE ROW LEVEL SECURITY;
 
 -- --------------------------------------------------------
 -- COMENTÁRIOS
@@ -232,8 +326,11 @@ COMMENT ON TABLE  subscriptions IS 'Contratos de recorrência (Clubes de milhas)
 COMMENT ON COLUMN subscriptions.cpm_fixo               IS 'Coluna CALCULADA (gerada). Imutável manualmente.';
 COMMENT ON COLUMN subscriptions.valor_total_ciclo      IS 'Custo total pago no ciclo.';
 COMMENT ON COLUMN subscriptions.milhas_garantidas_ciclo IS 'Total de milhas garantidas no ciclo.';
+COMMENT ON COLUMN subscriptions.milhas_creditadas_ciclo IS 'Soma de milhas_creditadas das transações vinculadas. Mantido pelo trigger trg_maintain_subscription_credits; não escrever manualmente.';
 COMMENT ON COLUMN subscriptions.data_renovacao         IS 'Data da próxima renovação ou débito.';
 
+COMMENT ON TABLE  balances IS 'Saldo agregado por conta/programa. Mantido pelo trigger trg_maintain_balances; não escrever manualmente.';
+
 COMMENT ON TABLE  cpm_checkpoints                    IS 'Fotografias do estado de CPM por conta/programa. Base do protocolo de reajuste de CPM.';
 COMMENT ON COLUMN cpm_checkpoints.tipo               IS 'MENSAL=fechamento de mês, MANUAL=confirmação manual, AUTO=criado automaticamente pós-ajuste';
 COMMENT ON COLUMN cpm_checkpoints.periodo_referencia IS 'Formato YYYY-MM. Preenchido apenas em tipo=MENSAL. Índice único garante 1 fechamento por mês.';
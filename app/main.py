@@ -8,7 +8,7 @@ from slack_sdk.signature import SignatureVerifier
 # --- IMPORTS DA ARQUITETURA ---
 from app.config.settings import settings
 from app.core.database import Database
-from app.core.logging_config import setup_logging
+from app.core.logging_config import setup_logging, shutdown_logging
 from app.agents.milhas_agent import milhas_agent
 
 # Configuração de Logs via Settings
@@ -27,6 +27,7 @@ async def lifespan(app: FastAPI):
     # 2. Shutdown: Fecha conexões graciosamente
     logger.info("🛑 Fechando conexões...")
     Database.close()
+    shutdown_logging()
 
 # Inicializa FastAPI com o gerenciador de vida
 app = FastAPI(title="WF Milhas - Slack Bot", lifespan=lifespan)
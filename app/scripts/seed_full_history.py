@@ -23,7 +23,8 @@ def clean_db(conn):
     print("🧹 Limpando dados antigos no Supabase...")
     with conn.cursor() as cur:
         # Apagar na ordem inversa das dependências
-        tables = ["transaction_batches", "transactions", "accounts"]
+        # (TRUNCATE não dispara o trigger de balances — por isso ela entra na lista)
+        tables = ["transaction_batches", "transactions", "balances", "accounts"]
         for t in tables:
             cur.execute(f"TRUNCATE TABLE {t} CASCADE")
     conn.commit()
@@ -34,23 +35,16 @@ def seed_full():
     clean_db(conn)
     
     with conn.cursor() as cur:
-        # --- 1. RECUPERAR PROGRAMAS ---
-        # (Assumindo que você já inseriu os programas via SQL ou manualmente. 
-        # Se a tabela programs estiver vazia, precisamos inserir aqui).
-        cur.execute("SELECT count(*) FROM programs")
-        result = cur.fetchone()
-        if result and result[0] == 0:
-            print("⚠️ Tabela programs vazia. Inserindo programas padrão...")
-            progs = [
-                ("Livelo", "BANCO"), ("Esfera", "BANCO"),
-                ("LATAM Pass", "CIA_AEREA"), ("Smiles", "CIA_AEREA"),
-                ("Azul Fidelidade", "CIA_AEREA"), ("TAP Miles&Go", "CIA_AEREA")
-            ]
-            for p in progs:
-                cur.execute(
-                    "INSERT INTO programs (nome, tipo) VALUES (%s, %s)",
-                    p
-                )
+        # --- 1. GARANTIR PROGRAMAS PADRÃO ---
+        # Um único INSERT multi-linha idempotente: programas já existentes
+        # (programs.nome é UNIQUE) são ignorados, sem SELECT count(*) prévio.
+        cur.execute("""
+            INSERT INTO programs (nome, tipo) VALUES
+                ('Livelo', 'BANCO'), ('Esfera', 'BANCO'),
+                ('LATAM Pass', 'CIA_AEREA'), ('Smiles', 'CIA_AEREA'),
+                ('Azul Fidelidade', 'CIA_AEREA'), ('TAP Miles&Go', 'CIA_AEREA')
+            ON CONFLICT (nome) DO NOTHING
+        """)
         
         # Mapear IDs
         prog_map = {}
@@ -68,18 +62,20 @@ def seed_full():
 
         # --- 2. CRIAR PERFIS (CONTAS) ---
         
+        # IDs como uuid.UUID: o psycopg adapta nativamente para o tipo UUID (sem str intermediário)
+
         # PERFIL A: GESTÃO DE CPF (Ana Paula)
-        ana_id = str(uuid.uuid4())
+        ana_id = uuid.uuid4()
         cur.execute("INSERT INTO accounts (id, cpf, nome, tipo_gestao) VALUES (%s, %s, %s, %s)", 
                    (ana_id, "111.222.333-44", "Ana Paula (Gestão)", "PROPRIA"))
 
         # PERFIL B: CLIENTE PREMIUM (Dr. Roberto)
-        roberto_id = str(uuid.uuid4())
+        roberto_id = uuid.uuid4()
         cur.execute("INSERT INTO accounts (id, cpf, nome, tipo_gestao) VALUES (%s, %s, %s, %s)", 
                    (roberto_id, "999.888.777-66", "Dr. Roberto Premium", "CLIENTE"))
 
         # PERFIL C: WILLIAM (Própria)
-        william_id = str(uuid.uuid4())
+        william_id = uuid.uuid4()
         cur.execute("INSERT INTO accounts (id, cpf, nome, tipo_gestao) VALUES (%s, %s, %s, %s)", 
                    (william_id, "000.000.000-01", "William Assis", "PROPRIA"))
 
@@ -90,7 +86,7 @@ def seed_full():
         print("   -> Gerando histórico da Ana Paula...")
         
         # Compra Esfera
-        tx1 = str(uuid.uuid4())
+        tx1 = uuid.uuid4()
         cur.execute("""
             INSERT INTO transactions (id, account_id, data_registro, modo_aquisicao, origem_id, destino_id, companhia_referencia_id, milhas_base, bonus_percent, milhas_creditadas, custo_total, cpm_real, descricao)
             VALUES (%s, %s, CURRENT_DATE - 120, 'COMPRA_BANCO', %s, %s, %s, 200000, 0, 200000, 7000.00, 35.00, 'Compra Esfera 50%% OFF')
@@ -99,7 +95,7 @@ def seed_full():
         cur.execute("INSERT INTO transaction_batches (transaction_id, tipo, milhas_qtd, cpm_origem, custo_parcial) VALUES (%s, 'PAGO', 200000, 35.00, 7000.00)", (tx1,))
 
         # Transferência Bumerangue Latam
-        tx2 = str(uuid.uuid4())
+        tx2 = uuid.uuid4()
         cur.execute("""
             INSERT INTO transactions (id, account_id, data_registro, modo_aquisicao, origem_id, destino_id, companhia_referencia_id, milhas_base, bonus_percent, milhas_creditadas, custo_total, cpm_real, descricao)
             VALUES (%s, %s, CURRENT_DATE - 90, 'TRANSFERENCIA_BANCO_CIA', %s, %s, %s, 100000, 40.0, 140000, 3500.00, 25.00, 'Transf. Esfera->Latam Promo')
@@ -120,7 +116,7 @@ def seed_full():
             """, (roberto_id, days_ago, livelo, livelo))
 
         # Clube Livelo
-        tx_clube = str(uuid.uuid4())
+        tx_clube = uuid.uuid4()
         cur.execute("""
             INSERT INTO transactions (id, account_id, data_registro, modo_aquisicao, origem_id, destino_id, companhia_referencia_id, milhas_base, bonus_percent, milhas_creditadas, custo_total, cpm_real, descricao)
             VALUES (%s, %s, CURRENT_DATE - 60, 'CLUBE_ASSINATURA', %s, %s, %s, 240000, 0, 240000, 4800.00, 20.00, 'Clube Livelo Top Anual')
@@ -129,6 +125,14 @@ def seed_full():
         cur.execute("INSERT INTO transaction_batches (transaction_id, tipo, milhas_qtd, cpm_origem, custo_parcial) VALUES (%s, 'PAGO', 240000, 20.00, 4800.00)", (tx_clube,))
 
     conn.commit()
+
+    # Atualiza as estatísticas do planner logo após a carga em massa
+    # (o autovacuum só faria isso depois; até lá o planner ignoraria os índices)
+    with conn.cursor() as cur:
+        for t in ["accounts", "programs", "transactions", "transaction_batches", "balances"]:
+            cur.execute(f"ANALYZE {t}")
+    conn.commit()
+
     conn.close()
     print("\n✅ Banco Supabase populado com sucesso!")
 
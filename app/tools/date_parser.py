@@ -45,5 +45,5 @@ def parse_date_natural(texto: Optional[str], prefer_future: bool = False) -> Opt
 
 
 def format_date_br(data: date) -> str:
-    """Formata date como DD/MM/AAAA."""
-    return data.strftime("%d/%m/%Y")
+    """Formata date como DD/MM/AAAA (formatação inteira, sem strftime/locale)."""
+    return f"{data.day:02d}/{data.month:02d}/{data.year}"
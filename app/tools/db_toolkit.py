@@ -1,28 +1,340 @@
 import functools
 import logging
+import os
 import psycopg
 import re
 import time
-import uuid
+from decimal import ROUND_HALF_UP, Decimal
 from datetime import date
 from typing import Optional, Tuple
 from agno.tools import Toolkit
 from app.core.database import Database
 from app.core.enums import TipoLote, ModoAquisicao
-from app.tools.date_parser import parse_date_natural
+from app.tools.date_parser import format_date_br, parse_date_natural
 
 _logger = logging.getLogger("wf_milhas.tools")
 
-_MESES_PT = {
-    1: "janeiro", 2: "fevereiro", 3: "março", 4: "abril",
-    5: "maio", 6: "junho", 7: "julho", 8: "agosto",
-    9: "setembro", 10: "outubro", 11: "novembro", 12: "dezembro",
-}
+# Padrões de normalização pré-compilados (usados em toda resolução de conta)
+_RE_PREFIX = re.compile(r"^\s*conta\s+(da|do|de|para)\s+", re.IGNORECASE)
+_RE_NONDIGITS = re.compile(r"\D")
+_HEX_CHARS = frozenset("0123456789abcdefABCDEF")
+# Escapa curingas do ILIKE numa só passada (inclui a própria barra de escape)
+_ILIKE_ESCAPE = str.maketrans({"%": "\\%", "_": "\\_", "\\": "\\\\"})
+
+# Valores aceitos em accounts.tipo_gestao
+_TIPOS_GESTAO = frozenset({"PROPRIA", "CLIENTE"})
+
+# Nomes dos meses indexados por (mês - 1)
+_MESES_PT = (
+    "janeiro", "fevereiro", "março", "abril", "maio", "junho",
+    "julho", "agosto", "setembro", "outubro", "novembro", "dezembro",
+)
+# Variantes de exibição pré-computadas ("Janeiro", "Jan"), mesmo índice de _MESES_PT
+_MESES_CAP = tuple(m.capitalize() for m in _MESES_PT)
+_MESES_CAP3 = tuple(m[:3] for m in _MESES_CAP)
+
+# Transações sem checkpoint a partir das quais o resumo/panorama sugerem confirmar o CPM
+_LIMITE_TX_SEM_CHECKPOINT = 10
+
+# Moldura fixa da tabela do panorama (montada uma vez no import)
+_PANORAMA_SEP = "─" * 72
+_PANORAMA_COLUNAS = (
+    f"{_PANORAMA_SEP}\n"
+    f"{'Programa':<12} {'Milhas':>12}   {'CPM':>9}   {'Fechamento':<14} {'s/chk':>5}   Status\n"
+    f"{_PANORAMA_SEP}"
+)
+
+# SQL fixo dos caminhos de escrita mais quentes (montado uma vez, reutilizado em toda chamada).
+# Datas NULL viram CURRENT_DATE do servidor (mesmo relógio dos créditos de clube).
+_SQL_INSERT_TX = """
+    INSERT INTO transactions
+    (account_id, data_registro, data_transacao, modo_aquisicao, origem_id, destino_id, companhia_referencia_id,
+     milhas_base, bonus_percent, milhas_creditadas, custo_total, cpm_real, descricao, observacao, subscription_id)
+    VALUES (%s, COALESCE(%s, CURRENT_DATE), COALESCE(%s, CURRENT_DATE), %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
+    RETURNING id
+"""
+
+# Transferência: transação pai + lotes filhos numa única instrução (CTE com escrita).
+# Lotes com quantidade zero são filtrados no próprio SQL.
+_SQL_INSERT_TRANSFER = """
+    WITH tx AS (
+        INSERT INTO transactions
+        (account_id, data_registro, data_transacao, modo_aquisicao, origem_id, destino_id, companhia_referencia_id,
+         milhas_base, bonus_percent, milhas_creditadas, custo_total, cpm_real, descricao, observacao)
+        VALUES (%(account_id)s, %(data_registro)s, %(data_transacao)s, %(modo)s, %(origem_id)s, %(destino_id)s,
+                %(destino_id)s, %(milhas_base)s, %(bonus_percent)s, %(milhas_creditadas)s, %(custo_total)s,
+                %(cpm_real)s, %(descricao)s, %(observacao)s)
+        RETURNING id
+    ),
+    lotes AS (
+        INSERT INTO transaction_batches (transaction_id, tipo, milhas_qtd, cpm_origem, custo_parcial, ordem)
+        SELECT tx.id, l.tipo, l.milhas_qtd, l.cpm_origem, l.custo_parcial, l.ordem
+        FROM tx CROSS JOIN (VALUES
+            (%(org_tipo)s::text, %(org_qtd)s::integer, %(org_cpm)s::numeric, %(org_custo)s::numeric, 1),
+            (%(pago_tipo)s::text, %(pago_qtd)s::integer, %(pago_cpm)s::numeric, %(pago_custo)s::numeric, 2)
+        ) AS l(tipo, milhas_qtd, cpm_origem, custo_parcial, ordem)
+        WHERE l.milhas_qtd > 0
+    )
+    SELECT id FROM tx
+"""
+
+# Trava por (conta, programa) para operações sobre a assinatura ativa: advisory lock
+# de transação (liberado no COMMIT/ROLLBACK), fora da fila de row locks. O crédito
+# mensal usa a versão não bloqueante e desiste se outra operação estiver em curso;
+# a correção de assinatura (rara) usa a bloqueante e espera.
+_SQL_TRY_LOCK_SUBSCRIPTION = """
+    SELECT pg_try_advisory_xact_lock(hashtextextended(%(acc_id)s::text || ':' || %(prog_id)s::text, 0))
+"""
+_SQL_LOCK_SUBSCRIPTION = """
+    SELECT pg_advisory_xact_lock(hashtextextended(%(acc_id)s::text || ':' || %(prog_id)s::text, 0))
+"""
+
+# Após a trava: quantidade (manual ou 1/12 do contrato), trava de segurança e INSERT
+# condicional numa só ida ao banco. Retorna os dados do contrato mesmo quando a trava
+# barra o crédito (custo_inserido NULL). CPM fixo do contrato usado direto (sem dízimas);
+# modo CLUBE_ASSINATURA distingue créditos de contrato de compras avulsas.
+_SQL_CREDIT_SUBSCRIPTION = """
+    WITH sub AS (
+        SELECT s.id, s.cpm_fixo, s.milhas_garantidas_ciclo,
+               CASE WHEN %(qtd)s::integer > 0 THEN %(qtd)s::integer
+                    ELSE s.milhas_garantidas_ciclo / 12 END AS qtd,
+               -- Contador mantido por trigger em transactions: O(1), sem somar o histórico
+               s.milhas_creditadas_ciclo AS ja_creditado
+        FROM subscriptions s
+        WHERE s.account_id = %(acc_id)s AND s.programa_id = %(prog_id)s AND s.ativo = TRUE
+        ORDER BY s.created_at DESC
+        LIMIT 1
+    ),
+    ins AS (
+        INSERT INTO transactions
+        (account_id, data_registro, data_transacao, modo_aquisicao, origem_id, destino_id, companhia_referencia_id,
+         milhas_base, bonus_percent, milhas_creditadas, custo_total, cpm_real, descricao, subscription_id)
+        SELECT %(acc_id)s, CURRENT_DATE, CURRENT_DATE, %(modo)s, %(prog_id)s, %(prog_id)s, %(prog_id)s,
+               sub.qtd, 0, sub.qtd, sub.qtd / 1000.0 * sub.cpm_fixo, sub.cpm_fixo, %(descricao)s, sub.id
+        FROM sub
+        WHERE sub.qtd <= sub.milhas_garantidas_ciclo - sub.ja_creditado
+        RETURNING custo_total
+    )
+    SELECT sub.cpm_fixo, sub.milhas_garantidas_ciclo, sub.qtd, sub.ja_creditado, ins.custo_total
+    FROM sub LEFT JOIN ins ON TRUE
+"""
+
+# Novo contrato ativo; cpm_fixo é coluna gerada, devolvida pelo RETURNING.
+# Usado direto por register_subscription e como CTE em _SQL_REPLACE_SUBSCRIPTION.
+_SQL_INSERT_SUBSCRIPTION = """
+    INSERT INTO subscriptions
+    (account_id, programa_id, valor_total_ciclo, milhas_garantidas_ciclo,
+     data_inicio, data_renovacao, ativo)
+    VALUES (%(acc_id)s, %(prog_id)s, %(valor)s, %(milhas)s, %(inicio)s, %(renovacao)s, TRUE)
+    RETURNING id, cpm_fixo
+"""
+
+# Correção de assinatura: cria o contrato corrigido e, na mesma instrução, re-vincula
+# as transações do contrato desativado (a FK é checada ao fim da instrução, quando a
+# nova linha já existe). Com old_sub_id NULL o re-vínculo não afeta nenhuma linha.
+_SQL_REPLACE_SUBSCRIPTION = f"""
+    WITH nova AS ({_SQL_INSERT_SUBSCRIPTION}),
+    relink AS (
+        UPDATE transactions t
+        SET subscription_id = nova.id
+        FROM nova
+        WHERE t.subscription_id = %(old_sub_id)s
+    )
+    SELECT id, cpm_fixo FROM nova
+"""
+
+# CTEs comuns às escritas do protocolo de CPM: "pre" = totais atuais (último
+# checkpoint + transações posteriores) e período do delta, numa linha só.
+_SQL_CPM_PRE_CTES = """
+    chk AS (
+        SELECT total_milhas, total_custo, created_at
+        FROM cpm_checkpoints
+        WHERE account_id = %(acc_id)s AND programa_id = %(prog_id)s
+        ORDER BY created_at DESC
+        LIMIT 1
+    ),
+    pre AS (
+        SELECT COALESCE((SELECT total_milhas FROM chk), 0) + COALESCE(SUM(t.milhas_creditadas), 0) AS milhas,
+               COALESCE((SELECT total_custo FROM chk), 0) + COALESCE(SUM(t.custo_total), 0) AS custo,
+               MIN(t.data_transacao) AS min_dt,
+               MAX(t.data_transacao) AS max_dt
+        FROM transactions t
+        WHERE t.account_id = %(acc_id)s AND t.companhia_referencia_id = %(prog_id)s
+          AND t.created_at > COALESCE((SELECT created_at FROM chk), '-infinity')
+    )
+"""
+
+# Checkpoint MENSAL/MANUAL: totais + INSERT numa única instrução. Sem milhas, nada é
+# gravado; fechamento mensal duplicado é descartado pelo índice único (id NULL).
+_SQL_CONFIRM_CPM_CHECKPOINT = f"""
+    WITH {_SQL_CPM_PRE_CTES},
+    ins AS (
+        INSERT INTO cpm_checkpoints
+        (account_id, programa_id, data_checkpoint, total_milhas, total_custo,
+         cpm_snapshot, tipo, periodo_referencia, delta_data_inicio, delta_data_fim,
+         descricao, observacao)
+        SELECT %(acc_id)s, %(prog_id)s, CURRENT_DATE, milhas, custo,
+               COALESCE(ROUND(custo / NULLIF(milhas::numeric, 0) * 1000, 2), 0),
+               %(tipo)s, %(periodo)s, min_dt, max_dt, %(descricao)s, %(observacao)s
+        FROM pre
+        WHERE milhas > 0
+        -- Duplicidade de fechamento mensal (idx_cpm_checkpoints_mensal_unico)
+        ON CONFLICT (account_id, programa_id, periodo_referencia)
+            WHERE periodo_referencia IS NOT NULL
+            DO NOTHING
+        RETURNING id
+    )
+    SELECT pre.milhas, pre.custo, pre.min_dt, pre.max_dt, (SELECT id FROM ins)
+    FROM pre
+"""
+
+# Ajuste de CPM: lê os totais (último checkpoint + delta), grava a transação de ajuste
+# e o checkpoint AUTO pós-ajuste numa única instrução. Nada é gravado se o ajuste
+# tornaria o custo total negativo (novo fica vazio). Retorna os totais PRÉ-ajuste.
+# Transação e checkpoint são datados pelo mesmo relógio (CURRENT_DATE do servidor).
+_SQL_APPLY_CPM_ADJUSTMENT = f"""
+    WITH {_SQL_CPM_PRE_CTES},
+    novo AS (
+        SELECT milhas + %(milhas)s AS milhas, custo + %(custo)s::numeric AS custo, min_dt, max_dt
+        FROM pre
+        WHERE custo + %(custo)s::numeric >= 0
+    ),
+    tx AS (
+        INSERT INTO transactions
+        (account_id, data_registro, data_transacao, modo_aquisicao, origem_id, destino_id, companhia_referencia_id,
+         milhas_base, bonus_percent, milhas_creditadas, custo_total, cpm_real, descricao, observacao)
+        SELECT %(acc_id)s, CURRENT_DATE, CURRENT_DATE, %(modo)s, NULL, %(prog_id)s, %(prog_id)s,
+               %(milhas)s, 0, %(milhas)s, %(custo)s, 0, %(descricao_tx)s, %(observacao)s
+        FROM novo
+    ),
+    ins_chk AS (
+        INSERT INTO cpm_checkpoints
+        (account_id, programa_id, data_checkpoint, total_milhas, total_custo,
+         cpm_snapshot, tipo, delta_data_inicio, delta_data_fim, descricao, observacao)
+        SELECT %(acc_id)s, %(prog_id)s, CURRENT_DATE, milhas, custo,
+               COALESCE(ROUND(custo / NULLIF(milhas::numeric, 0) * 1000, 2), 0),
+               'AUTO', LEAST(min_dt, CURRENT_DATE), GREATEST(max_dt, CURRENT_DATE),
+               %(descricao_chk)s, %(observacao)s
+        FROM novo
+    )
+    SELECT pre.milhas, pre.custo, EXISTS (SELECT 1 FROM novo) AS aplicado
+    FROM pre
+"""
+
+# Lookup de conta: as três sondas (UUID → CPF → Nome parcial) rodam juntas e a
+# prioridade decide o vencedor. Sondas que não se aplicam recebem NULL e não retornam linhas.
+#   1. UUID: o tipo uuid do Postgres aceita hex sem hífens → usa a PK
+#   2. CPF: compara só os dígitos
+#   3. Nome parcial (Case Insensitive); prefixos como 'conta da/do/de' já foram
+#      removidos por _normalize_identifier. Servido pelo índice trigram.
+_SQL_LOOKUP_ACCOUNT = """
+    SELECT id, nome FROM (
+        (SELECT id, nome, 1 AS prio FROM accounts
+         WHERE id = %(uuid)s::uuid)
+        UNION ALL
+        (SELECT id, nome, 2 FROM accounts
+         WHERE regexp_replace(cpf, '\\D', '', 'g') = %(cpf)s
+         LIMIT 1)
+        UNION ALL
+        (SELECT id, nome, 3 FROM accounts
+         WHERE nome ILIKE %(nome)s ESCAPE '\\'
+         LIMIT 1)
+    ) sondas
+    ORDER BY prio
+    LIMIT 1
+"""
+
+# Lookup de programas em lote: mesma semântica do ILIKE '%nome%' por nome, via LATERAL.
+# Entradas que já são UUID vão direto à PK (a sonda por nome fica desligada).
+# Só os nomes encontrados retornam linha.
+_SQL_LOOKUP_PROGRAMS = """
+    SELECT n.nome, p.id
+    FROM unnest(%(prog_nomes)s::text[], %(prog_uids)s::uuid[]) AS n(nome, uid)
+    CROSS JOIN LATERAL (
+        (SELECT id FROM programs WHERE id = n.uid)
+        UNION ALL
+        (SELECT id FROM programs
+         WHERE n.uid IS NULL AND nome ILIKE '%%' || n.nome || '%%'
+         LIMIT 1)
+        LIMIT 1
+    ) p
+"""
+
+# Conta + programas numa só ida ao banco: sempre volta ao menos uma linha, com NULL
+# do lado que não foi encontrado (conta repetida em cada linha de programa).
+_SQL_RESOLVE_ACCOUNT_PROGRAMS = f"""
+    SELECT a.id, a.nome, p.nome, p.id
+    FROM (SELECT) AS um
+    LEFT JOIN ({_SQL_LOOKUP_ACCOUNT}) a ON TRUE
+    LEFT JOIN ({_SQL_LOOKUP_PROGRAMS}) p ON TRUE
+"""
+
+# Limite de entradas por cache de lookup (descarta a menos usada ao estourar)
+_LOOKUP_CACHE_MAX = 256
+# Validade (segundos) das entradas: contas podem ser criadas/alteradas fora do bot;
+# programas são praticamente estáticos.
+_ACCOUNT_CACHE_TTL = 60
+_PROGRAM_CACHE_TTL = 600
+# "Não encontrado" também é guardado, por pouco tempo: o agente costuma repetir a
+# mesma busca sem sucesso em sequência. Contas (None, None); programas "".
+_NEGATIVE_CACHE_TTL = 15
+
+
+def _cache_get(cache: dict, key: str):
+    """
+    Retorna o valor cacheado se ainda válido; remove e retorna None se expirado.
+    Um acerto move a entrada para o fim do dict (mais recente), o que faz a
+    remoção pelo início em _cache_put descartar a menos usada (LRU).
+    """
+    entry = cache.pop(key, None)
+    if entry is None:
+        return None
+    value, expires_at = entry
+    if time.monotonic() >= expires_at:
+        return None
+    cache[key] = entry
+    return value
+
+
+def _cache_put(cache: dict, key: str, value, ttl: float) -> None:
+    """Insere no cache de lookup com validade ttl, respeitando _LOOKUP_CACHE_MAX (LRU)."""
+    cache.pop(key, None)
+    if len(cache) >= _LOOKUP_CACHE_MAX:
+        cache.pop(next(iter(cache)), None)
+    cache[key] = (value, time.monotonic() + ttl)
+
+
+def _as_uuid_hex(texto: str) -> Optional[str]:
+    """
+    Retorna os 32 hex do UUID se o texto tiver formato de UUID (com ou sem hífens);
+    senão None. Nomes e CPFs, o caso comum, saem no teste de tamanho sem varrer a string.
+    """
+    if 32 <= len(texto) <= 36:
+        hex_part = texto.replace("-", "")
+        if len(hex_part) == 32 and all(c in _HEX_CHARS for c in hex_part):
+            return hex_part
+    return None
+
+
+def _checkpoint_ref_txt(tipo: str, periodo_referencia: Optional[str]) -> str:
+    """Sufixo de exibição do checkpoint: ' (YYYY-MM)' se mensal, senão ' (TIPO)'."""
+    return f" ({periodo_referencia})" if periodo_referencia else f" ({tipo})"
+
+
+_CENTAVO = Decimal("0.01")
+
+
+def _cpm_centavos(total_custo: Decimal, total_milhas: int) -> Decimal:
+    """
+    CPM (R$/milheiro) em centavos exatos, arredondado meio-para-cima como o
+    ROUND(numeric, 2) do Postgres — o mesmo valor gravado em cpm_snapshot.
+    """
+    return (total_custo * 1000 / total_milhas).quantize(_CENTAVO, ROUND_HALF_UP)
 
 
 def _sanitize_error(tool_name: str, e: Exception) -> str:
     """Loga a exceção real e retorna mensagem genérica com ref rastreável ao agente (segurança)."""
-    ref = uuid.uuid4().hex[:8]
+    ref = os.urandom(4).hex()
     _logger.error("tool_exception", extra={
         "event": "tool_exception",
         "tool": tool_name,
@@ -34,24 +346,43 @@ def _sanitize_error(tool_name: str, e: Exception) -> str:
 
 def log_tool_call(func):
     """Loga início, duração e outcome de cada tool call. Nunca loga parâmetros (LGPD)."""
+    tool_name = func.__name__
+    # extra do tool_start é fixo por tool: montado uma vez na decoração
+    # (o logging só lê o dict ao criar o record, nunca o altera)
+    start_extra = {"event": "tool_start", "tool": tool_name}
+
     @functools.wraps(func)
     def wrapper(*args, **kwargs):
-        _logger.info("tool_start", extra={"event": "tool_start", "tool": func.__name__})
-        t0 = time.perf_counter()
+        # INFO desligado: pula cronometragem e records de start/ok;
+        # exceções não tratadas continuam logadas em ERROR
+        if not _logger.isEnabledFor(logging.INFO):
+            try:
+                return func(*args, **kwargs)
+            except Exception as e:
+                _logger.error("tool_error", extra={
+                    "event": "tool_error",
+                    "tool": tool_name,
+                    "error_type": type(e).__name__,
+                })
+                raise
+
+        _logger.info("tool_start", extra=start_extra)
+        # Relógio monotônico em ns inteiros (clock_gettime via vDSO, sem float)
+        t0 = time.perf_counter_ns()
         try:
             result = func(*args, **kwargs)
             _logger.info("tool_ok", extra={
                 "event": "tool_ok",
-                "tool": func.__name__,
-                "duration_ms": int((time.perf_counter() - t0) * 1000),
+                "tool": tool_name,
+                "duration_ms": (time.perf_counter_ns() - t0) // 1_000_000,
             })
             return result
         except Exception as e:
             _logger.error("tool_error", extra={
                 "event": "tool_error",
-                "tool": func.__name__,
+                "tool": tool_name,
                 "error_type": type(e).__name__,
-                "duration_ms": int((time.perf_counter() - t0) * 1000),
+                "duration_ms": (time.perf_counter_ns() - t0) // 1_000_000,
             })
             raise
     return wrapper
@@ -61,6 +392,12 @@ class DatabaseManager(Toolkit):
         super().__init__(name="gerenciador_banco_dados")
         Database.initialize()
 
+        # Cache em processo de nome/identificador → id (acertos e, por _NEGATIVE_CACHE_TTL,
+        # também "não encontrado"). TTL curto para contas (create_account também invalida);
+        # longo para programas. Entradas: chave → (valor, expira_em monotonic)
+        self._program_cache: dict[str, Tuple[str, float]] = {}
+        self._account_cache: dict[str, Tuple[Tuple[Optional[str], Optional[str]], float]] = {}
+
         # Contas e programas
         self.register(self.check_account_exists)
         self.register(self.create_account)
@@ -102,12 +439,12 @@ class DatabaseManager(Toolkit):
         Normaliza o identificador removendo prefixos comuns como "conta da".
         """
         texto = str(identificador).strip()
-        texto = re.sub(r"^\s*conta\s+(da|do|de|para)\s+", "", texto, flags=re.IGNORECASE)
+        texto = _RE_PREFIX.sub("", texto)
         return texto.strip()
 
     def _normalize_cpf(self, cpf: str) -> str:
         """Remove caracteres não numéricos do CPF."""
-        return re.sub(r"\D", "", str(cpf or ""))
+        return _RE_NONDIGITS.sub("", str(cpf or ""))
 
     def _is_valid_cpf(self, cpf: str) -> bool:
         """
@@ -115,70 +452,171 @@ class DatabaseManager(Toolkit):
         Espera receber CPF já normalizado (apenas dígitos).
         """
         cpf_digits = cpf  # já normalizado pelo chamador
-        if len(cpf_digits) != 11:
+        # isascii: \D preserva dígitos Unicode (ex.: arábicos), que ord()-48 não converte
+        if len(cpf_digits) != 11 or not cpf_digits.isascii():
             return False
         if cpf_digits == cpf_digits[0] * 11:
             return False
 
-        def calc_digit(base: str) -> str:
-            total = sum(int(d) * w for d, w in zip(base, range(len(base) + 1, 1, -1)))
-            resto = total % 11
-            return "0" if resto < 2 else str(11 - resto)
-
-        dig1 = calc_digit(cpf_digits[:9])
-        dig2 = calc_digit(cpf_digits[:9] + dig1)
-        return cpf_digits[-2:] == dig1 + dig2
+        # Cálculo desenrolado com pesos constantes (sem zip/range/geradores)
+        d = [ord(c) - 48 for c in cpf_digits]
+        s1 = 10*d[0] + 9*d[1] + 8*d[2] + 7*d[3] + 6*d[4] + 5*d[5] + 4*d[6] + 3*d[7] + 2*d[8]
+        r = s1 % 11
+        v1 = 0 if r < 2 else 11 - r
+        s2 = 11*d[0] + 10*d[1] + 9*d[2] + 8*d[3] + 7*d[4] + 6*d[5] + 5*d[6] + 4*d[7] + 3*d[8] + 2*v1
+        r = s2 % 11
+        v2 = 0 if r < 2 else 11 - r
+        return d[9] == v1 and d[10] == v2
 
     # ── Helpers: lookup de entidades no banco ────────────────────────────────
 
-    def _get_account_id(self, conn: psycopg.Connection, identificador: str) -> Tuple[Optional[str], Optional[str]]:
-        """Busca ID e Nome da conta por UUID, CPF ou Nome parcial."""
+    def _account_lookup_params(self, identificador: str) -> Optional[dict]:
+        """
+        Monta os parâmetros de _SQL_LOOKUP_ACCOUNT para o identificador informado.
+        Retorna None quando não há nada aproveitável para buscar.
+        """
         identificador_raw = str(identificador).strip()
         identificador_norm = self._normalize_identifier(identificador_raw)
-        identificador_norm = identificador_norm.replace("%", "\\%").replace("_", "\\_")
         cpf_digits = self._normalize_cpf(identificador_raw)
-        
-        with conn.cursor() as cur:
-            # 1. Tenta UUID primeiro (com ou sem hífens)
-            # Remove tudo que não é hexadecimal para comparar
-            uuid_clean = re.sub(r"[^a-fA-F0-9]", "", identificador_raw)
-            if len(uuid_clean) == 32:  # UUID sem hífens tem 32 chars hex
-                # Busca comparando apenas os caracteres hex (ignorando hífens)
-                cur.execute("""
-                    SELECT id, nome FROM accounts 
-                    WHERE REPLACE(id::text, '-', '') = %s
-                """, (uuid_clean,))
-                row = cur.fetchone()
-                if row:
-                    return row[0], row[1]
-            
-            # 2. Tenta CPF (normalizando pontuações)
-            if len(cpf_digits) == 11:
-                cur.execute(
-                    "SELECT id, nome FROM accounts WHERE regexp_replace(cpf, '\\D', '', 'g') = %s",
-                    (cpf_digits,)
-                )
-                row = cur.fetchone()
-                if row:
-                    return row[0], row[1]
-            
-            # 3. Tenta Nome parcial (Case Insensitive)
-            #    Prefixos como 'conta da/do/de' já foram removidos por _normalize_identifier
-            cur.execute("SELECT id, nome FROM accounts WHERE nome ILIKE %s", (f"%{identificador_norm}%",))
-            row = cur.fetchone()
-            if row:
-                return row[0], row[1]
-            
+
+        uuid_clean = _as_uuid_hex(identificador_raw)
+        cpf_param = cpf_digits if len(cpf_digits) == 11 else None
+        if uuid_clean is not None:
+            # Entrada já é um UUID (chamadas automatizadas do agente): só a sonda de PK
+            # importa — CPF e nome recebem NULL e não varrem nada
+            cpf_param = None
+            identificador_norm = ""
+        # Nada aproveitável para buscar: evita a ida ao banco (e um ILIKE '%%',
+        # que casaria com qualquer conta)
+        if not identificador_norm and cpf_param is None and uuid_clean is None:
+            return None
+        return {
+            "uuid": uuid_clean,
+            "cpf": cpf_param,
+            "nome": f"%{identificador_norm.translate(_ILIKE_ESCAPE)}%" if identificador_norm else None,
+        }
+
+    def _get_account_id(self, conn: psycopg.Connection, identificador: str) -> Tuple[Optional[str], Optional[str]]:
+        """Busca ID e Nome da conta por UUID, CPF ou Nome parcial."""
+        cache_key = str(identificador).strip().lower()
+        cached = _cache_get(self._account_cache, cache_key)
+        if cached:  # (id, nome) ou (None, None) — tupla, sempre verdadeira
+            return cached
+        params = self._account_lookup_params(identificador)
+        if params is None:
             return None, None
 
-    def _get_program_id(self, conn: psycopg.Connection, nome_programa: str) -> Optional[str]:
-        """Busca ID do programa pelo nome."""
-        if not nome_programa: return None
+        # Uma única ida ao banco para as três sondas (ver _SQL_LOOKUP_ACCOUNT)
         with conn.cursor() as cur:
-            cur.execute("SELECT id FROM programs WHERE nome ILIKE %s", (f"%{nome_programa}%",))
+            cur.execute(_SQL_LOOKUP_ACCOUNT, params)
             row = cur.fetchone()
-            if row: return row[0]
-            return None
+
+        if row:
+            _cache_put(self._account_cache, cache_key, (row[0], row[1]), _ACCOUNT_CACHE_TTL)
+            return row[0], row[1]
+        _cache_put(self._account_cache, cache_key, (None, None), _NEGATIVE_CACHE_TTL)
+        return None, None
+
+    def _resolve_account_and_program(
+        self, conn: psycopg.Connection, nome_conta: str, nome_programa: Optional[str],
+    ) -> Tuple[Optional[str], Optional[str], Optional[str]]:
+        """
+        Resolve conta e programa juntos: retorna (acc_id, acc_nome, prog_id).
+        prog_id é None se nome_programa vier vazio ou não for encontrado.
+        """
+        acc_id, acc_nome, prog_ids = self._resolve_account_and_programs(
+            conn, nome_conta, [nome_programa] if nome_programa else []
+        )
+        return acc_id, acc_nome, prog_ids.get(nome_programa) if nome_programa else None
+
+    def _resolve_account_and_programs(
+        self, conn: psycopg.Connection, nome_conta: str, nomes: list[str],
+    ) -> Tuple[Optional[str], Optional[str], dict[str, str]]:
+        """
+        Resolve a conta e vários programas juntos: retorna (acc_id, acc_nome,
+        {nome_informado: id}). Se a conta e algum programa faltam no cache, tudo sai
+        numa única consulta; senão só o lado que falta vai ao banco.
+        """
+        acc_key = str(nome_conta).strip().lower()
+        encontrados, faltantes = self._cached_program_ids(nomes)
+        if not faltantes or _cache_get(self._account_cache, acc_key):
+            acc_id, acc_nome = self._get_account_id(conn, nome_conta)
+            if not acc_id:
+                return None, None, {}
+            return acc_id, acc_nome, self._fetch_program_ids(conn, faltantes, encontrados)
+
+        params = self._account_lookup_params(nome_conta)
+        if params is None:
+            return None, None, {}
+        params["prog_nomes"] = list(faltantes)
+        params["prog_uids"] = [_as_uuid_hex(nome) for nome in faltantes]
+        with conn.cursor() as cur:
+            cur.execute(_SQL_RESOLVE_ACCOUNT_PROGRAMS, params)
+            rows = cur.fetchall()
+
+        acc_id, acc_nome = rows[0][0], rows[0][1]
+        _cache_put(self._account_cache, acc_key, (acc_id, acc_nome),
+                   _ACCOUNT_CACHE_TTL if acc_id else _NEGATIVE_CACHE_TTL)
+        self._cache_program_rows(
+            faltantes, [(nome, prog_id) for _, _, nome, prog_id in rows if nome], encontrados
+        )
+        if not acc_id:
+            return None, None, {}
+        return acc_id, acc_nome, encontrados
+
+    def _cached_program_ids(self, nomes: list[str]) -> Tuple[dict[str, str], dict[str, list[str]]]:
+        """
+        Separa os nomes em já resolvidos pelo cache ({nome_informado: id}) e faltantes
+        ({nome_sem_espaços: [nomes_informados]}). O nome sem espaços nas pontas é o
+        que vai ao banco e, em minúsculas, a chave do cache: a busca e o cache
+        (inclusive o negativo) enxergam sempre o mesmo valor.
+        """
+        encontrados: dict[str, str] = {}
+        faltantes: dict[str, list[str]] = {}
+        for nome in nomes:
+            nome_norm = nome.strip() if nome else ""
+            if not nome_norm:
+                continue
+            cached = _cache_get(self._program_cache, nome_norm.lower())
+            if cached is not None:
+                if cached:  # "" = não encontrado recentemente
+                    encontrados[nome] = cached
+            elif nome not in faltantes.setdefault(nome_norm, []):
+                faltantes[nome_norm].append(nome)
+        return encontrados, faltantes
+
+    def _fetch_program_ids(
+        self, conn: psycopg.Connection, faltantes: dict[str, list[str]], encontrados: dict[str, str],
+    ) -> dict[str, str]:
+        """
+        Busca no banco, em UM único round-trip, os nomes de programa que faltaram no
+        cache e os acrescenta a encontrados ({nome_informado: id}, só os achados).
+        """
+        if faltantes:
+            with conn.cursor() as cur:
+                cur.execute(_SQL_LOOKUP_PROGRAMS, {
+                    "prog_nomes": list(faltantes),
+                    "prog_uids": [_as_uuid_hex(nome) for nome in faltantes],
+                })
+                self._cache_program_rows(faltantes, cur.fetchall(), encontrados)
+        return encontrados
+
+    def _cache_program_rows(
+        self, faltantes: dict[str, list[str]], rows: list, encontrados: dict[str, str],
+    ) -> None:
+        """
+        Guarda no cache os (nome_sem_espaços, id) encontrados e, como negativos, os
+        demais faltantes; encontrados recebe o id sob cada nome como informado.
+        """
+        achados = set()
+        for nome_norm, prog_id in rows:
+            _cache_put(self._program_cache, nome_norm.lower(), prog_id, _PROGRAM_CACHE_TTL)
+            achados.add(nome_norm)
+            for nome in faltantes.get(nome_norm, ()):
+                encontrados[nome] = prog_id
+        for nome_norm in faltantes:
+            if nome_norm not in achados:
+                _cache_put(self._program_cache, nome_norm.lower(), "", _NEGATIVE_CACHE_TTL)
 
     # ── Helpers: validação e inserção de assinaturas ─────────────────────────
 
@@ -217,7 +655,7 @@ class DatabaseManager(Toolkit):
         if data_renov_dt <= dt_inicio:
             return (
                 f"❌ Erro: A data de renovação deve ser posterior à data de início. "
-                f"Início: {dt_inicio.strftime('%d/%m/%Y')}, Renovação: {data_renov_dt.strftime('%d/%m/%Y')}.",
+                f"Início: {format_date_br(dt_inicio)}, Renovação: {format_date_br(data_renov_dt)}.",
                 None, None, None, None, None,
             )
 
@@ -253,14 +691,11 @@ class DatabaseManager(Toolkit):
         Retorna (new_sub_id, cpm_fixo) calculado pelo banco, ou None se o RETURNING não retornar linha.
         """
         with conn.cursor() as cur:
-            cur.execute("""
-                INSERT INTO subscriptions
-                (account_id, programa_id, valor_total_ciclo, milhas_garantidas_ciclo,
-                 data_inicio, data_renovacao, ativo)
-                VALUES (%s, %s, %s, %s, %s, %s, TRUE)
-                RETURNING id, cpm_fixo
-            """, (acc_id, prog_id, valor_contrato, milhas_contrato, dt_inicio, data_renov_dt),
-            prepare=False)
+            cur.execute(_SQL_INSERT_SUBSCRIPTION, {
+                "acc_id": acc_id, "prog_id": prog_id,
+                "valor": valor_contrato, "milhas": milhas_contrato,
+                "inicio": dt_inicio, "renovacao": data_renov_dt,
+            })
             result = cur.fetchone()
             if not result:
                 return None
@@ -293,7 +728,7 @@ class DatabaseManager(Toolkit):
         try:
             # Normalização simples para o ENUM
             tipo = str(tipo_gestao).upper().strip()
-            if tipo not in ['PROPRIA', 'CLIENTE']:
+            if tipo not in _TIPOS_GESTAO:
                 return "❌ Erro: O tipo de gestão deve ser 'PROPRIA' ou 'CLIENTE'."
 
             # Normalização do CPF (strip antes para eliminar whitespace puro)
@@ -307,20 +742,20 @@ class DatabaseManager(Toolkit):
 
             with self._get_conn() as conn:
                 with conn.cursor() as cur:
-                    # Verifica duplicidade de CPF
-                    cur.execute("SELECT 1 FROM accounts WHERE regexp_replace(cpf, '\\D', '', 'g') = %s", (cpf_clean,))
-                    if cur.fetchone():
-                        return "❌ Erro: Já existe uma conta com este CPF."
-
-                    cur.execute(
-                        "INSERT INTO accounts (nome, tipo_gestao, cpf) VALUES (%s, %s, %s) RETURNING id",
-                        (nome_completo, tipo, cpf_clean)
-                    )
+                    # Checagem de duplicidade + inserção numa única instrução atômica:
+                    # o índice único de CPF normalizado é o árbitro do ON CONFLICT.
+                    cur.execute("""
+                        INSERT INTO accounts (nome, tipo_gestao, cpf) VALUES (%s, %s, %s)
+                        ON CONFLICT ((regexp_replace(cpf, '\\D', '', 'g'))) DO NOTHING
+                        RETURNING id
+                    """, (nome_completo, tipo, cpf_clean))
                     result = cur.fetchone()
                     if not result:
-                        return "❌ Erro: Não foi possível criar a conta."
+                        return "❌ Erro: Já existe uma conta com este CPF."
                     account_id = result[0]
                 conn.commit()
+            # Nova conta pode mudar a resolução de nomes parciais já cacheados
+            self._account_cache.clear()
 
             return f"✅ Conta criada com sucesso para **{nome_completo}** ({tipo})! ID: {account_id}"
         except Exception as e:
@@ -367,8 +802,9 @@ class DatabaseManager(Toolkit):
             observacao: Observação livre do usuário
         """
         try:
-            # 1. Parse de data
-            data_tx = parse_date_natural(data_transacao) if data_transacao else date.today()
+            # 1. Parse de data (hoje lido uma vez: serve de padrão e de data_registro)
+            hoje = date.today()
+            data_tx = parse_date_natural(data_transacao) if data_transacao else hoje
             if not data_tx:
                 return f"❌ Erro: Não consegui interpretar a data '{data_transacao}'."
             
@@ -390,36 +826,30 @@ class DatabaseManager(Toolkit):
                 descricao = f"Compra Simples: {milhas_base:,} milhas{tag_bonus} em {nome_programa}"
             
             with self._get_conn() as conn:
-                acc_id, acc_nome = self._get_account_id(conn, nome_conta)
+                acc_id, acc_nome, prog_id = self._resolve_account_and_program(conn, nome_conta, nome_programa)
                 if not acc_id: return f"❌ Conta '{nome_conta}' não encontrada."
-                
-                prog_id = self._get_program_id(conn, nome_programa)
                 if not prog_id: return f"❌ Programa '{nome_programa}' não encontrado."
                 
                 # 4. CPM Real baseado no total creditado
                 cpm_real = (custo_final / total_milhas * 1000) if total_milhas > 0 else 0
                 
-                with conn.cursor() as cur:
-                    cur.execute("""
-                        INSERT INTO transactions
-                        (account_id, data_registro, data_transacao, modo_aquisicao, origem_id, destino_id, companhia_referencia_id,
-                         milhas_base, bonus_percent, milhas_creditadas, custo_total, cpm_real, descricao, observacao, subscription_id)
-                        VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
-                    """, (acc_id, date.today(), data_tx, modo.value,
+                # Pipeline: INSERT + COMMIT vão juntos ao servidor (1 round-trip na escrita).
+                # Único commit por tool call — lookups + INSERT na mesma transação.
+                with conn.pipeline(), conn.cursor() as cur:
+                    cur.execute(_SQL_INSERT_TX, (acc_id, hoje, data_tx, modo.value,
                           prog_id, prog_id, prog_id, 
                           milhas_base, bonus, total_milhas, 
-                          custo_final, cpm_real, descricao, observacao, None),
-                          prepare=False)
-                    
+                          custo_final, cpm_real, descricao, observacao, None))
                     conn.commit()
-                    
-                    msg_bonus = f"\n🎁 **Bônus:** {int(bonus)}% aplicado" if bonus > 0 else ""
-                    return (
-                        f"✅ Transação Salva para {acc_nome}!{msg_bonus}\n"
-                        f"📊 **Milhas Creditadas:** {total_milhas:,}\n"
-                        f"💰 **CPM Final:** R$ {cpm_real:.2f}"
-                    )
-            
+
+            # Resposta montada após devolver a conexão ao pool
+            msg_bonus = f"\n🎁 **Bônus:** {int(bonus)}% aplicado" if bonus > 0 else ""
+            return (
+                f"✅ Transação Salva para {acc_nome}!{msg_bonus}\n"
+                f"📊 **Milhas Creditadas:** {total_milhas:,}\n"
+                f"💰 **CPM Final:** R$ {cpm_real:.2f}"
+            )
+
         except Exception as e:
             return _sanitize_error("save_simple_transaction", e)
 
@@ -446,17 +876,40 @@ class DatabaseManager(Toolkit):
             observacao: Observação opcional fornecida pelo usuário.
         """
         try:
-            # Parse e validação de data
-            data_tx = parse_date_natural(data_transacao) if data_transacao else date.today()
+            # Parse e validação de data (hoje lido uma vez: serve de padrão e de data_registro)
+            hoje = date.today()
+            data_tx = parse_date_natural(data_transacao) if data_transacao else hoje
             if not data_tx:
                 return f"❌ Erro: Não consegui interpretar a data '{data_transacao}'. Use formatos como 'hoje', 'ontem', 'DD/MM/AAAA' ou 'DD de mês de AAAA'."
-            
+
+            # Validações e cálculos antes de pegar conexão do pool (não a segura em Python puro)
+            if milhas_base <= 0:
+                return "❌ Erro: milhas_base deve ser maior que zero."
+            if bonus_percent < 0:
+                return "❌ Erro: bonus_percent não pode ser negativo."
+            if lote_organico_qtd < 0 or lote_pago_qtd < 0:
+                return "❌ Erro: quantidades de lotes não podem ser negativas."
+            if lote_organico_qtd + lote_pago_qtd != milhas_base:
+                return f"❌ Erro: A soma dos lotes ({lote_organico_qtd + lote_pago_qtd}) deve ser igual a milhas_base ({milhas_base})."
+
+            # Cálculos Financeiros
+            custo_organico = (lote_organico_qtd / 1000) * lote_organico_cpm
+            custo_total = custo_organico + lote_pago_custo_total
+            milhas_creditadas = int(milhas_base * (1 + bonus_percent / 100))
+            cpm_real = (custo_total / milhas_creditadas * 1000) if milhas_creditadas > 0 else 0
+            cpm_pago = (lote_pago_custo_total / lote_pago_qtd * 1000) if lote_pago_qtd > 0 else 0
+
+            # Descrição sempre gerada automaticamente
+            descricao = f"Transfer {origem_nome}→{destino_nome}: {lote_pago_qtd:,} pagos (R${lote_pago_custo_total:.2f}) + {lote_organico_qtd:,} orgânicos, bônus {bonus_percent}%"
+
             with self._get_conn() as conn:
-                acc_id, acc_nome = self._get_account_id(conn, identificador_conta)
+                acc_id, acc_nome, prog_ids = self._resolve_account_and_programs(
+                    conn, identificador_conta, [origem_nome, destino_nome]
+                )
                 if not acc_id: return f"❌ Conta '{identificador_conta}' não encontrada."
-                
-                orig_id = self._get_program_id(conn, origem_nome)
-                dest_id = self._get_program_id(conn, destino_nome)
+
+                orig_id = prog_ids.get(origem_nome)
+                dest_id = prog_ids.get(destino_nome)
                 
                 # Mensagens de erro mais específicas
                 if not orig_id:
@@ -464,59 +917,25 @@ class DatabaseManager(Toolkit):
                 if not dest_id:
                     return f"❌ Programa de Destino '{destino_nome}' não encontrado."
 
-                # Validações de entrada
-                if milhas_base <= 0:
-                    return "❌ Erro: milhas_base deve ser maior que zero."
-                if bonus_percent < 0:
-                    return "❌ Erro: bonus_percent não pode ser negativo."
-                if lote_organico_qtd < 0 or lote_pago_qtd < 0:
-                    return "❌ Erro: quantidades de lotes não podem ser negativas."
-                if lote_organico_qtd + lote_pago_qtd != milhas_base:
-                    return f"❌ Erro: A soma dos lotes ({lote_organico_qtd + lote_pago_qtd}) deve ser igual a milhas_base ({milhas_base})."
-
-                # Cálculos Financeiros
-                custo_organico = (lote_organico_qtd / 1000) * lote_organico_cpm
-                custo_total = custo_organico + lote_pago_custo_total
-                milhas_creditadas = int(milhas_base * (1 + bonus_percent / 100))
-                cpm_real = (custo_total / milhas_creditadas * 1000) if milhas_creditadas > 0 else 0
-
-                # Descrição sempre gerada automaticamente
-                descricao = f"Transfer {origem_nome}→{destino_nome}: {lote_pago_qtd:,} pagos (R${lote_pago_custo_total:.2f}) + {lote_organico_qtd:,} orgânicos, bônus {bonus_percent}%"
-
-                with conn.cursor() as cur:
-                    cur.execute("""
-                        INSERT INTO transactions
-                        (account_id, data_registro, data_transacao, modo_aquisicao, origem_id, destino_id, companhia_referencia_id,
-                         milhas_base, bonus_percent, milhas_creditadas, custo_total, cpm_real, descricao, observacao)
-                        VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
-                        RETURNING id
-                    """, (acc_id, date.today(), data_tx, ModoAquisicao.TRANSFERENCIA.value, orig_id, dest_id, dest_id,
-                          milhas_base, bonus_percent, milhas_creditadas, custo_total, cpm_real, descricao, observacao),
-                          prepare=False)
-                    
-                    result = cur.fetchone()
-                    if not result:
-                        return "❌ Erro: Não foi possível criar a transferência."
-                    tx_id = result[0]
-
-                    # Inserir Lotes Filhos
-                    if lote_organico_qtd > 0:
-                        cur.execute("""
-                            INSERT INTO transaction_batches (transaction_id, tipo, milhas_qtd, cpm_origem, custo_parcial, ordem)
-                            VALUES (%s, %s, %s, %s, %s, 1)
-                        """, (tx_id, TipoLote.ORGANICO.value, lote_organico_qtd, lote_organico_cpm, custo_organico),
-                             prepare=False)
-                    
-                    if lote_pago_qtd > 0:
-                        cpm_pago = (lote_pago_custo_total / lote_pago_qtd * 1000)
-                        cur.execute("""
-                            INSERT INTO transaction_batches (transaction_id, tipo, milhas_qtd, cpm_origem, custo_parcial, ordem)
-                            VALUES (%s, %s, %s, %s, %s, 2)
-                        """, (tx_id, TipoLote.PAGO.value, lote_pago_qtd, cpm_pago, lote_pago_custo_total),
-                             prepare=False)
+                # Pai + lotes numa só instrução: sem esperar o id do pai para mandar os filhos.
+                # Pipeline: INSERT + COMMIT vão juntos ao servidor (1 round-trip na escrita).
+                with conn.pipeline(), conn.cursor() as cur:
+                    cur.execute(_SQL_INSERT_TRANSFER, {
+                        "account_id": acc_id, "data_registro": hoje, "data_transacao": data_tx,
+                        "modo": ModoAquisicao.TRANSFERENCIA.value,
+                        "origem_id": orig_id, "destino_id": dest_id,
+                        "milhas_base": milhas_base, "bonus_percent": bonus_percent,
+                        "milhas_creditadas": milhas_creditadas, "custo_total": custo_total,
+                        "cpm_real": cpm_real, "descricao": descricao, "observacao": observacao,
+                        "org_tipo": TipoLote.ORGANICO.value, "org_qtd": lote_organico_qtd,
+                        "org_cpm": lote_organico_cpm, "org_custo": custo_organico,
+                        "pago_tipo": TipoLote.PAGO.value, "pago_qtd": lote_pago_qtd,
+                        "pago_cpm": cpm_pago, "pago_custo": lote_pago_custo_total,
+                    })
+                    # Único commit — transação + lotes sobem juntos (ou nada sobe)
+                    conn.commit()
 
-                conn.commit()
-                return f"✅ Transferência Salva para {acc_nome}! CPM Final: **R$ {cpm_real:.2f}**"
+            return f"✅ Transferência Salva para {acc_nome}! CPM Final: **R$ {cpm_real:.2f}**"
         except Exception as e:
             return _sanitize_error("save_complex_transfer", e)
 
@@ -524,8 +943,8 @@ class DatabaseManager(Toolkit):
     def get_dashboard(self, identificador_conta: str) -> str:
         """
         Retorna o extrato consolidado de milhas e CPM médio por programa.
-        Agrega todas as transações da conta, exibindo saldo total e custo médio
-        por milheiro em cada programa com saldo positivo.
+        Lê o saldo agregado da conta (tabela balances), exibindo saldo total e custo
+        médio por milheiro em cada programa com saldo positivo.
         """
         try:
             with self._get_conn() as conn:
@@ -533,31 +952,27 @@ class DatabaseManager(Toolkit):
                 if not acc_id: return f"❌ Conta '{identificador_conta}' não encontrada."
 
                 with conn.cursor() as cur:
-                    # Query Otimizada com GROUP BY
+                    # Lê o saldo já agregado (mantido por trigger em transactions):
+                    # custo proporcional ao número de programas, não de transações.
+                    # O total geral vem pronto na mesma consulta (window sobre as linhas).
                     cur.execute("""
-                        SELECT p.nome, 
-                               SUM(t.milhas_creditadas) as saldo, 
-                               SUM(t.custo_total) / SUM(t.milhas_creditadas) * 1000 as cpm_medio
-                        FROM transactions t
-                        JOIN programs p ON t.companhia_referencia_id = p.id
-                        WHERE t.account_id = %s
-                        GROUP BY p.nome
-                        HAVING SUM(t.milhas_creditadas) > 0
+                        SELECT p.nome, b.total_milhas AS saldo,
+                               b.total_custo / b.total_milhas * 1000 AS cpm_medio,
+                               SUM(b.total_milhas) OVER () AS total_geral
+                        FROM balances b
+                        JOIN programs p ON p.id = b.programa_id
+                        WHERE b.account_id = %s AND b.total_milhas > 0
+                        ORDER BY b.total_milhas DESC
                     """, (acc_id,))
                     rows = cur.fetchall()
 
             if not rows:
                 return f"Nenhum saldo encontrado para {acc_nome}."
 
-            res = f"📊 **Extrato de {acc_nome}:**\n"
-            total_milhas = 0
-            for row in rows:
-                prog, saldo, cpm = row
-                total_milhas += saldo
-                res += f"- {prog}: {saldo:,.0f} milhas • CPM: R$ {cpm:.2f}\n"
-            
-            res += f"\n**Total Geral:** {total_milhas:,.0f} milhas"
-            return res
+            partes = [f"📊 **Extrato de {acc_nome}:**\n"]
+            partes.extend(f"- {prog}: {saldo:,.0f} milhas • CPM: R$ {cpm:.2f}\n" for prog, saldo, cpm, _ in rows)
+            partes.append(f"\n**Total Geral:** {rows[0][3]:,.0f} milhas")
+            return "".join(partes)
 
         except Exception as e:
             return _sanitize_error("get_dashboard", e)
@@ -602,11 +1017,9 @@ class DatabaseManager(Toolkit):
                 return _sanitize_error("register_subscription", ValueError("parse retornou None inesperado"))
 
             with self._get_conn() as conn:
-                acc_id, acc_nome = self._get_account_id(conn, nome_conta)
+                acc_id, acc_nome, prog_id = self._resolve_account_and_program(conn, nome_conta, nome_programa)
                 if not acc_id:
                     return f"❌ Conta '{nome_conta}' não encontrada."
-
-                prog_id = self._get_program_id(conn, nome_programa)
                 if not prog_id:
                     return f"❌ Programa '{nome_programa}' não encontrado."
 
@@ -625,8 +1038,8 @@ class DatabaseManager(Toolkit):
                     f"📊 **Contrato Anual:** {milhas_contrato:,} milhas\n"
                     f"💰 **Valor Global:** R$ {valor_contrato:.2f}\n"
                     f"📉 **CPM Travado:** R$ {cpm_calculado:.2f}\n"
-                    f"� **Início:** {dt_inicio.strftime('%d/%m/%Y')}\n"
-                    f"�🔄 **Renovação:** {data_renov_dt.strftime('%d/%m/%Y')}\n"
+                    f"� **Início:** {format_date_br(dt_inicio)}\n"
+                    f"�🔄 **Renovação:** {format_date_br(data_renov_dt)}\n"
                     f"✅ **Status:** Ativo\n"
                     f"ℹ️ *Nota: O sistema baixará 1/12 desse saldo a cada mensalidade.*"
                 )
@@ -677,17 +1090,18 @@ class DatabaseManager(Toolkit):
 
             # 2. UMA conexão, UMA transação — tudo atômico
             with self._get_conn() as conn:
-                acc_id, acc_nome = self._get_account_id(conn, nome_conta)
+                acc_id, acc_nome, prog_id = self._resolve_account_and_program(conn, nome_conta, nome_programa)
                 if not acc_id:
                     return f"❌ Conta '{nome_conta}' não encontrada."
-
-                prog_id = self._get_program_id(conn, nome_programa)
                 if not prog_id:
                     return f"❌ Programa '{nome_programa}' não encontrado."
 
                 # 3. Desativa a assinatura ativa mais recente do programa (sem deletar)
                 #    O trigger trg_maintain_consistency seta ativo=FALSE automaticamente ao preencher data_fim
-                with conn.cursor() as cur:
+                #    Antes, a mesma trava do crédito mensal (bloqueante): nenhum crédito entra no
+                #    contrato antigo depois do re-vínculo. Trava + UPDATE vão juntos (pipeline).
+                with conn.pipeline(), conn.cursor() as cur:
+                    conn.execute(_SQL_LOCK_SUBSCRIPTION, {"acc_id": acc_id, "prog_id": prog_id})
                     cur.execute("""
                         UPDATE subscriptions
                         SET data_fim = CURRENT_DATE
@@ -698,7 +1112,7 @@ class DatabaseManager(Toolkit):
                             LIMIT 1
                         )
                         RETURNING id;
-                    """, (acc_id, prog_id), prepare=False)
+                    """, (acc_id, prog_id))
                     row = cur.fetchone()
                 old_sub_id = str(row[0]) if row else None
 
@@ -708,27 +1122,24 @@ class DatabaseManager(Toolkit):
                     "(Nenhuma ativa encontrada — criando nova)"
                 )
 
-                # 4. Cria nova assinatura corrigida na mesma conexão
-                insert_result = self._insert_subscription(
-                    conn, acc_id, prog_id,
-                    valor_contrato, milhas_contrato, dt_inicio, data_renov_dt,
-                )
-                if insert_result is None:
-                    return "❌ Erro: Não foi possível criar a nova assinatura. A correção foi cancelada."
-                new_sub_id, cpm_calculado = insert_result
-
-                # 5. Re-vincula transações anteriores ao novo subscription_id
-                #    Mantém a trava de segurança de process_monthly_credit funcionando
-                if old_sub_id:
-                    with conn.cursor() as cur:
-                        cur.execute("""
-                            UPDATE transactions
-                            SET subscription_id = %s
-                            WHERE subscription_id = %s
-                        """, (new_sub_id, old_sub_id), prepare=False)
-
-                # 6. Único commit — desativação + inserção + re-vínculo sobem juntos
-                conn.commit()
+                # 4. Cria a assinatura corrigida e 5. re-vincula as transações anteriores
+                #    (mantém a trava de segurança de process_monthly_credit funcionando).
+                #    Pipeline: a instrução única + COMMIT vão juntos (1 round-trip); o
+                #    resultado é lido depois do sync. Requer libpq >= 14 no cliente (pipeline mode).
+                with conn.pipeline(), conn.cursor() as cur:
+                    cur.execute(_SQL_REPLACE_SUBSCRIPTION, {
+                        "acc_id": acc_id, "prog_id": prog_id,
+                        "valor": valor_contrato, "milhas": milhas_contrato,
+                        "inicio": dt_inicio, "renovacao": data_renov_dt,
+                        "old_sub_id": old_sub_id,
+                    })
+                    # 6. Único commit — desativação + inserção + re-vínculo sobem juntos
+                    conn.commit()
+                    insert_result = cur.fetchone()
+
+            if not insert_result:
+                return "❌ Erro: Não foi possível criar a nova assinatura. A correção foi cancelada."
+            cpm_calculado = insert_result[1]
 
             return (
                 f"✅ **Assinatura Corrigida com Sucesso!** {msg_anterior}\n"
@@ -736,8 +1147,8 @@ class DatabaseManager(Toolkit):
                 f"📊 **Contrato Anual:** {milhas_contrato:,} milhas\n"
                 f"💰 **Valor Global:** R$ {valor_contrato:.2f}\n"
                 f"📉 **CPM Travado:** R$ {cpm_calculado:.2f}\n"
-                f"📅 **Início:** {dt_inicio.strftime('%d/%m/%Y')}\n"
-                f"🔄 **Renovação:** {data_renov_dt.strftime('%d/%m/%Y')}\n"
+                f"📅 **Início:** {format_date_br(dt_inicio)}\n"
+                f"🔄 **Renovação:** {format_date_br(data_renov_dt)}\n"
                 f"✅ **Status:** Ativo"
             )
 
@@ -767,94 +1178,86 @@ class DatabaseManager(Toolkit):
         """
         try:
             with self._get_conn() as conn:
-                acc_id, acc_nome = self._get_account_id(conn, nome_conta)
+                acc_id, acc_nome, prog_id = self._resolve_account_and_program(conn, nome_conta, nome_programa)
                 if not acc_id:
                     return f"❌ Conta '{nome_conta}' não encontrada."
 
-                # Monta a query de busca com filtro opcional de programa
+                # Filtro opcional de programa (texto SQL fixo por variante)
+                filtro_sql, params = "", [acc_id]
+                if nome_programa:
+                    if not prog_id:
+                        return f"❌ Programa '{nome_programa}' não encontrado."
+                    filtro_sql = "AND t.companhia_referencia_id = %s"
+                    params.append(prog_id)
+
                 with conn.cursor() as cur:
-                    if nome_programa:
-                        prog_id = self._get_program_id(conn, nome_programa)
-                        if not prog_id:
-                            return f"❌ Programa '{nome_programa}' não encontrado."
-                        cur.execute("""
-                            SELECT t.id, p.nome, t.modo_aquisicao,
-                                   t.milhas_base, t.bonus_percent, t.milhas_creditadas,
-                                   t.custo_total, t.cpm_real, t.data_transacao,
-                                   t.descricao, t.subscription_id
-                            FROM transactions t
-                            JOIN programs p ON p.id = t.companhia_referencia_id
-                            WHERE t.account_id = %s AND t.companhia_referencia_id = %s
-                            ORDER BY t.created_at DESC
-                            LIMIT 1
-                        """, (acc_id, prog_id))
-                    else:
-                        cur.execute("""
-                            SELECT t.id, p.nome, t.modo_aquisicao,
-                                   t.milhas_base, t.bonus_percent, t.milhas_creditadas,
-                                   t.custo_total, t.cpm_real, t.data_transacao,
-                                   t.descricao, t.subscription_id
-                            FROM transactions t
-                            JOIN programs p ON p.id = t.companhia_referencia_id
-                            WHERE t.account_id = %s
-                            ORDER BY t.created_at DESC
+                    # Última transação + checkpoint criado depois dela, numa só consulta.
+                    # Checkpoint posterior significa que a transação está na base do snapshot
+                    # (deletá-la corromperia o checkpoint).
+                    cur.execute(f"""
+                        SELECT t.id, p.nome, t.modo_aquisicao,
+                               t.milhas_base, t.bonus_percent, t.milhas_creditadas,
+                               t.custo_total, t.cpm_real, t.data_transacao,
+                               t.descricao, t.subscription_id,
+                               chk.tipo, chk.cpm_snapshot, chk.periodo_referencia
+                        FROM transactions t
+                        JOIN programs p ON p.id = t.companhia_referencia_id
+                        LEFT JOIN LATERAL (
+                            SELECT c.tipo, c.cpm_snapshot, c.periodo_referencia
+                            FROM cpm_checkpoints c
+                            WHERE c.account_id = t.account_id
+                              AND c.programa_id = t.companhia_referencia_id
+                              AND c.created_at > t.created_at
+                            ORDER BY c.created_at DESC
                             LIMIT 1
-                        """, (acc_id,))
-
+                        ) chk ON TRUE
+                        WHERE t.account_id = %s {filtro_sql}
+                        ORDER BY t.created_at DESC
+                        LIMIT 1
+                    """, params)
                     row = cur.fetchone()
-                    if not row:
-                        filtro = f" no programa '{nome_programa}'" if nome_programa else ""
-                        return f"❌ Nenhuma transação encontrada para {acc_nome}{filtro}."
-
-                    tx_id, prog_nome, modo, milhas_base, bonus_pct, milhas_cred, \
-                        custo, cpm, data_tx, descricao, sub_id = row
 
-                    aviso_clube = (
-                        "\n⚠️ *Esta transação pertence a uma assinatura. "
-                        "Deletá-la altera o progresso do contrato.*"
-                    ) if sub_id else ""
-
-                    # Verifica se existe checkpoint criado após esta transação
-                    # (significaria que a transação está na base do snapshot e corromperia o checkpoint)
-                    cur.execute("""
-                        SELECT tipo, cpm_snapshot, periodo_referencia
-                        FROM cpm_checkpoints
-                        WHERE account_id = %s
-                          AND programa_id = (SELECT companhia_referencia_id FROM transactions WHERE id = %s)
-                          AND created_at > (SELECT created_at FROM transactions WHERE id = %s)
-                        ORDER BY created_at DESC
-                        LIMIT 1
-                    """, (acc_id, tx_id, tx_id))
-                    chk = cur.fetchone()
-                    if chk:
-                        chk_tipo, chk_cpm, chk_ref = chk
-                        ref_txt = f" ({chk_ref})" if chk_ref else f" ({chk_tipo})"
-                        aviso_checkpoint = (
-                            f"\n🚨 *Esta transação está incluída em um checkpoint de CPM{ref_txt} "
-                            f"(CPM confirmado: R$ {float(chk_cpm):.2f}). "
-                            f"Deletá-la invalidará esse checkpoint, que será removido automaticamente.*"
-                        )
-                    else:
-                        aviso_checkpoint = ""
-
-                    bonus_info = f" + {int(bonus_pct)}% bônus" if bonus_pct else ""
-                    resumo = (
-                        f"📋 **Última transação de {acc_nome}:**\n"
-                        f"- Programa : {prog_nome}\n"
-                        f"- Modo     : {modo}\n"
-                        f"- Milhas   : {milhas_base:,} base{bonus_info} → {milhas_cred:,} creditadas\n"
-                        f"- Custo    : R$ {custo:.2f} | CPM R$ {cpm:.2f}\n"
-                        f"- Data     : {data_tx.strftime('%d/%m/%Y') if data_tx else 'N/A'}\n"
-                        f"- Descrição: {descricao or '—'}"
-                        f"{aviso_clube}"
-                        f"{aviso_checkpoint}"
-                    )
+                if not row:
+                    filtro = f" no programa '{nome_programa}'" if nome_programa else ""
+                    return f"❌ Nenhuma transação encontrada para {acc_nome}{filtro}."
+
+            # Resumo montado após devolver a conexão ao pool
+            tx_id, prog_nome, modo, milhas_base, bonus_pct, milhas_cred, \
+                custo, cpm, data_tx, descricao, sub_id, chk_tipo, chk_cpm, chk_ref = row
+
+            aviso_clube = (
+                "\n⚠️ *Esta transação pertence a uma assinatura. "
+                "Deletá-la altera o progresso do contrato.*"
+            ) if sub_id else ""
+
+            if chk_tipo:
+                ref_txt = _checkpoint_ref_txt(chk_tipo, chk_ref)
+                aviso_checkpoint = (
+                    f"\n🚨 *Esta transação está incluída em um checkpoint de CPM{ref_txt} "
+                    f"(CPM confirmado: R$ {chk_cpm:.2f}). "
+                    f"Deletá-la invalidará esse checkpoint, que será removido automaticamente.*"
+                )
+            else:
+                aviso_checkpoint = ""
+
+            bonus_info = f" + {int(bonus_pct)}% bônus" if bonus_pct else ""
+            resumo = (
+                f"📋 **Última transação de {acc_nome}:**\n"
+                f"- Programa : {prog_nome}\n"
+                f"- Modo     : {modo}\n"
+                f"- Milhas   : {milhas_base:,} base{bonus_info} → {milhas_cred:,} creditadas\n"
+                f"- Custo    : R$ {custo:.2f} | CPM R$ {cpm:.2f}\n"
+                f"- Data     : {format_date_br(data_tx) if data_tx else 'N/A'}\n"
+                f"- Descrição: {descricao or '—'}"
+                f"{aviso_clube}"
+                f"{aviso_checkpoint}"
+            )
 
-                    return (
-                        f"{resumo}\n\n"
-                        f"❓ Confirma a exclusão? Se sim, chame `confirm_delete_transaction`"
-                        f" com `transaction_id='{tx_id}'`."
-                    )
+            return (
+                f"{resumo}\n\n"
+                f"❓ Confirma a exclusão? Se sim, chame `confirm_delete_transaction`"
+                f" com `transaction_id='{tx_id}'`."
+            )
 
         except Exception as e:
             return _sanitize_error("delete_last_transaction", e)
@@ -870,38 +1273,49 @@ class DatabaseManager(Toolkit):
         """
         try:
             with self._get_conn() as conn:
-                with conn.cursor() as cur:
+                # Uma instrução: lê a transação, remove os checkpoints que a incluíam na
+                # base (criados depois dela) e a própria transação. Pipeline: + COMMIT
+                # na mesma rajada (1 round-trip). Sem linha = transação não encontrada.
+                with conn.pipeline(), conn.cursor() as cur:
                     cur.execute("""
-                        SELECT t.id, p.nome, t.milhas_creditadas, t.custo_total, t.data_transacao,
-                               t.account_id, t.companhia_referencia_id, t.created_at
-                        FROM transactions t
-                        JOIN programs p ON p.id = t.companhia_referencia_id
-                        WHERE t.id = %s
+                        WITH tx AS (
+                            SELECT t.id, p.nome, t.milhas_creditadas, t.custo_total, t.data_transacao,
+                                   t.account_id, t.companhia_referencia_id, t.created_at
+                            FROM transactions t
+                            JOIN programs p ON p.id = t.companhia_referencia_id
+                            WHERE t.id = %s
+                        ),
+                        del_chk AS (
+                            DELETE FROM cpm_checkpoints c
+                            USING tx
+                            WHERE c.account_id = tx.account_id
+                              AND c.programa_id = tx.companhia_referencia_id
+                              AND c.created_at > tx.created_at
+                            RETURNING c.tipo, c.periodo_referencia, c.cpm_snapshot
+                        ),
+                        del_tx AS (
+                            DELETE FROM transactions t
+                            USING tx
+                            WHERE t.id = tx.id
+                        )
+                        SELECT tx.nome, tx.milhas_creditadas, tx.custo_total, tx.data_transacao,
+                               (SELECT COALESCE(json_agg(json_build_array(tipo, periodo_referencia, cpm_snapshot::text)), '[]')
+                                FROM del_chk)
+                        FROM tx
                     """, (transaction_id,))
+                    conn.commit()
                     row = cur.fetchone()
-                    if not row:
-                        return "❌ Transação não encontrada. Verifique o ID ou execute o preview novamente."
-
-                    tx_id, prog_nome, milhas, custo, data_tx, acc_id, prog_id_ref, tx_created_at = row
 
-                    # Remove checkpoints que incluíam esta transação na sua base
-                    cur.execute("""
-                        DELETE FROM cpm_checkpoints
-                        WHERE account_id = %s AND programa_id = %s AND created_at > %s
-                        RETURNING tipo, periodo_referencia, cpm_snapshot
-                    """, (acc_id, prog_id_ref, tx_created_at))
-                    chks_removidos = cur.fetchall()
+            if not row:
+                return "❌ Transação não encontrada. Verifique o ID ou execute o preview novamente."
+            # json: o psycopg já entrega a lista de [tipo, periodo_referencia, cpm_snapshot].
+            # O snapshot vem como texto (número JSON viraria float) e volta a Decimal.
+            prog_nome, milhas, custo, data_tx, chks_removidos = row
 
-                    cur.execute("DELETE FROM transactions WHERE id = %s", (tx_id,), prepare=False)
-                conn.commit()
-
-            data_fmt = data_tx.strftime('%d/%m/%Y') if data_tx else 'N/A'
+            data_fmt = format_date_br(data_tx) if data_tx else 'N/A'
             aviso_chk = ""
             if chks_removidos:
-                descricoes = []
-                for tipo, ref, snap in chks_removidos:
-                    ref_txt = f" ({ref})" if ref else f" ({tipo})"
-                    descricoes.append(f"CPM R$ {float(snap):.2f}{ref_txt}")
+                descricoes = [f"CPM R$ {Decimal(snap):.2f}{_checkpoint_ref_txt(tipo, ref)}" for tipo, ref, snap in chks_removidos]
                 aviso_chk = (
                     f"\n🗑️ Checkpoint(s) invalidado(s) e removido(s): {', '.join(descricoes)}.\n"
                     f"   O histórico de CPM precisará ser reconfirmado."
@@ -931,100 +1345,68 @@ class DatabaseManager(Toolkit):
         """
         try:
             with self._get_conn() as conn:
-                acc_id, acc_nome = self._get_account_id(conn, nome_conta)
+                acc_id, acc_nome, prog_id = self._resolve_account_and_program(conn, nome_conta, nome_programa)
                 if not acc_id: return f"❌ Conta '{nome_conta}' não encontrada."
-
-                prog_id = self._get_program_id(conn, nome_programa)
                 if not prog_id: return f"❌ Programa '{nome_programa}' não encontrado."
 
+                params = {
+                    "acc_id": acc_id, "prog_id": prog_id, "qtd": int(milhas_do_mes),
+                    "modo": ModoAquisicao.CLUBE.value,
+                    "descricao": f'Crédito Mensal Clube - {nome_programa}',
+                }
                 with conn.cursor() as cur:
-                    # 1. Busca os dados do CONTRATO com lock exclusivo para evitar race condition.
-                    # FOR UPDATE bloqueia a linha da assinatura até o commit, garantindo que
-                    # execuções concorrentes para a mesma assinatura aguardem e nunca passem
-                    # pela validação de saldo com dados desatualizados.
-                    cur.execute("""
-                        SELECT id, cpm_fixo, milhas_garantidas_ciclo, valor_total_ciclo
-                        FROM subscriptions
-                        WHERE account_id = %s AND programa_id = %s AND ativo = TRUE
-                        ORDER BY created_at DESC
-                        LIMIT 1
-                        FOR UPDATE
-                    """, (acc_id, prog_id))
-                    
-                    sub = cur.fetchone()
-                    if not sub: return f"❌ Nenhuma assinatura ativa encontrada para {acc_nome} no programa {nome_programa}."
-                    
-                    sub_id, cpm_fixo, milhas_totais_contrato, valor_anual = sub
-
-                    # 2. Define a Quantidade
-                    if milhas_do_mes > 0:
-                        qtd_inserir = milhas_do_mes
-                        obs_origem = "(Manual)"
-                    else:
-                        qtd_inserir = int(milhas_totais_contrato / 12)
-                        obs_origem = "(Média linear)"
-
-                    # Trava de segurança: soma todas as milhas já creditadas nesta assinatura
-                    # e verifica se há saldo suficiente para a nova parcela.
-                    cur.execute("""
-                        SELECT COALESCE(SUM(milhas_creditadas), 0)
-                        FROM transactions
-                        WHERE subscription_id = %s
-                    """, (sub_id,))
-                    result = cur.fetchone()
-                    total_ja_creditado = result[0] if result else 0
-                    saldo_restante = milhas_totais_contrato - total_ja_creditado
-
-                    if qtd_inserir > saldo_restante:
-                        return (
-                            f"⛔ **BLOQUEIO DE SEGURANÇA**\n"
-                            f"Você tentou creditar **{qtd_inserir}** milhas, mas este contrato só tem **{saldo_restante}** milhas pendentes.\n\n"
-                            f"📊 **Resumo do Contrato:**\n"
-                            f"- Total Contratado: {milhas_totais_contrato}\n"
-                            f"- Já Creditado: {total_ja_creditado}\n"
-                            f"- Restante: {saldo_restante}\n\n"
-                            # MUDANÇA AQUI: Texto menos "sugestivo" para o Agente
-                            f"💡 *Dica: Se isso for um bônus extra, solicite uma nova operação de 'Compra Avulsa' ou 'Bônus' separadamente.*" 
-                        )
+                    # 1. Trava não bloqueante da assinatura: execuções concorrentes para a
+                    #    mesma conta/programa desistem na hora em vez de enfileirar, e nunca
+                    #    passam pela validação de saldo com dados desatualizados.
+                    cur.execute(_SQL_TRY_LOCK_SUBSCRIPTION, params)
+                    lock = cur.fetchone()
+                if not lock or not lock[0]:
+                    conn.rollback()
+                    return (
+                        f"⏳ Já há uma operação concorrente em andamento na assinatura de "
+                        f"{acc_nome} ({nome_programa}). Tente novamente em instantes."
+                    )
 
-                    # 3. Cálculo do custo contábil proporcional à parcela creditada.
-                    custo_contabil = (qtd_inserir / 1000) * float(cpm_fixo)
+                # 2. Crédito condicional + COMMIT numa só rajada (pipeline, 1 round-trip).
+                #    Instrução separada da trava: seu snapshot já enxerga o que a operação
+                #    anterior gravou antes de liberar a trava.
+                with conn.pipeline(), conn.cursor() as cur:
+                    cur.execute(_SQL_CREDIT_SUBSCRIPTION, params)
+                    conn.commit()
+                    row = cur.fetchone()
 
-                    # Usa o CPM fixo do contrato diretamente (sem recalcular sobre float)
-                    # para evitar dízimas e garantir consistência com o valor travado na assinatura.
-                    # Modo CLUBE_ASSINATURA distingue créditos de contrato de compras avulsas.
-                    cur.execute("""
-                        INSERT INTO transactions
-                        (account_id, data_registro, data_transacao, modo_aquisicao, origem_id, destino_id, companhia_referencia_id,
-                         milhas_base, bonus_percent, milhas_creditadas, custo_total, cpm_real, descricao, subscription_id)
-                        VALUES (%s, CURRENT_DATE, CURRENT_DATE, %s, %s, %s, %s, %s, 0, %s, %s, %s, %s, %s)
-                    """, (
-                        acc_id,
-                        ModoAquisicao.CLUBE.value,
-                        prog_id, prog_id, prog_id,  # origem/destino/ref = programa (operação interna)
-                        qtd_inserir,                # milhas_base
-                        qtd_inserir,                # milhas_creditadas (sem bônus em créditos de clube)
-                        custo_contabil,
-                        cpm_fixo,
-                        f'Crédito Mensal Clube - {nome_programa}',
-                        sub_id
-                    ), prepare=False)
-                    
-                    # Verifica Fim de Ciclo
-                    aviso_fim = ""
-                    if (saldo_restante - qtd_inserir) == 0:
-                        aviso_fim = "\n🏁 **Atenção:** O saldo deste contrato zerou! O ciclo anual foi concluído."
+            if not row:
+                return f"❌ Nenhuma assinatura ativa encontrada para {acc_nome} no programa {nome_programa}."
+            cpm_fixo, milhas_totais_contrato, qtd_inserir, total_ja_creditado, custo_contabil = row
+            saldo_restante = milhas_totais_contrato - total_ja_creditado
+            obs_origem = "(Manual)" if milhas_do_mes > 0 else "(Média linear)"
 
-                    conn.commit()
-                    
-                    percentual_concluido = ((total_ja_creditado + qtd_inserir) / milhas_totais_contrato) * 100
-                    
-                    return (
-                        f"✅ Crédito registrado com sucesso!\n"
-                        f"📊 +{qtd_inserir} milhas {obs_origem}\n"
-                        f"💰 Custo Contábil: R$ {custo_contabil:.2f} (CPM R$ {cpm_fixo:.2f})\n"
-                        f"📉 Progresso do Contrato: {percentual_concluido:.1f}% concluído.{aviso_fim}"
-                    )
+            # custo_contabil nulo = trava de segurança barrou o INSERT
+            if custo_contabil is None:
+                return (
+                    f"⛔ **BLOQUEIO DE SEGURANÇA**\n"
+                    f"Você tentou creditar **{qtd_inserir}** milhas, mas este contrato só tem **{saldo_restante}** milhas pendentes.\n\n"
+                    f"📊 **Resumo do Contrato:**\n"
+                    f"- Total Contratado: {milhas_totais_contrato}\n"
+                    f"- Já Creditado: {total_ja_creditado}\n"
+                    f"- Restante: {saldo_restante}\n\n"
+                    # MUDANÇA AQUI: Texto menos "sugestivo" para o Agente
+                    f"💡 *Dica: Se isso for um bônus extra, solicite uma nova operação de 'Compra Avulsa' ou 'Bônus' separadamente.*" 
+                )
+
+            # Verifica Fim de Ciclo
+            aviso_fim = ""
+            if (saldo_restante - qtd_inserir) == 0:
+                aviso_fim = "\n🏁 **Atenção:** O saldo deste contrato zerou! O ciclo anual foi concluído."
+
+            percentual_concluido = ((total_ja_creditado + qtd_inserir) / milhas_totais_contrato) * 100
+
+            return (
+                f"✅ Crédito registrado com sucesso!\n"
+                f"📊 +{qtd_inserir} milhas {obs_origem}\n"
+                f"💰 Custo Contábil: R$ {custo_contabil:.2f} (CPM R$ {cpm_fixo:.2f})\n"
+                f"📉 Progresso do Contrato: {percentual_concluido:.1f}% concluído.{aviso_fim}"
+            )
 
         except Exception as e:
             return _sanitize_error("process_monthly_credit", e)
@@ -1065,10 +1447,8 @@ class DatabaseManager(Toolkit):
                 tag_desc = f"(Compra Clube + {int(bonus)}% Bônus)"
 
             with self._get_conn() as conn:
-                acc_id, acc_nome = self._get_account_id(conn, nome_conta)
+                acc_id, acc_nome, prog_id = self._resolve_account_and_program(conn, nome_conta, nome_programa)
                 if not acc_id: return f"❌ Conta '{nome_conta}' não encontrada."
-
-                prog_id = self._get_program_id(conn, nome_programa)
                 if not prog_id: return f"❌ Programa '{nome_programa}' não encontrado."
 
                 with conn.cursor() as cur:
@@ -1088,14 +1468,13 @@ class DatabaseManager(Toolkit):
                     cpm_transacao = (custo_final / total_milhas * 1000) if total_milhas > 0 else 0
 
                     full_desc = f"{descricao} {tag_desc}"
-                    
-                    cur.execute("""
-                        INSERT INTO transactions
-                        (account_id, data_registro, data_transacao, modo_aquisicao, origem_id, destino_id, companhia_referencia_id,
-                         milhas_base, bonus_percent, milhas_creditadas, custo_total, cpm_real, descricao, subscription_id)
-                        VALUES (%s, CURRENT_DATE, CURRENT_DATE, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
-                    """, (
+
+                    # Mesmo texto SQL de save_simple_transaction: uma única entrada no
+                    # cache de prepared statements da conexão serve os dois caminhos.
+                    # Datas None: o banco usa CURRENT_DATE, como process_monthly_credit
+                    cur.execute(_SQL_INSERT_TX, (
                         acc_id,
+                        None, None,
                         modo,
                         prog_id, prog_id, prog_id,
                         milhas_base,
@@ -1104,8 +1483,9 @@ class DatabaseManager(Toolkit):
                         custo_final,
                         cpm_transacao,
                         full_desc,
+                        None,
                         sub_id
-                    ), prepare=False)
+                    ))
                     
                     conn.commit()
                     
@@ -1138,56 +1518,50 @@ class DatabaseManager(Toolkit):
             checkpoint:   dict com campos do registro, ou None se não houver
             delta:        tupla (count, sum_milhas, sum_custo, min_dt, max_dt, count_ajustes)
         """
-        checkpoint = None
+        # Uma só consulta: último checkpoint + agregado das transações posteriores a ele
+        # (todas, se não houver checkpoint), evitando reprocessar o histórico consolidado.
         with conn.cursor() as cur:
             cur.execute("""
-                SELECT id, total_milhas, total_custo, cpm_snapshot, created_at,
-                       tipo, periodo_referencia
-                FROM cpm_checkpoints
-                WHERE account_id = %s AND programa_id = %s
-                ORDER BY created_at DESC
-                LIMIT 1
-            """, (acc_id, prog_id))
+                WITH chk AS (
+                    SELECT id, total_milhas, total_custo, cpm_snapshot, created_at,
+                           tipo, periodo_referencia
+                    FROM cpm_checkpoints
+                    WHERE account_id = %(acc_id)s AND programa_id = %(prog_id)s
+                    ORDER BY created_at DESC
+                    LIMIT 1
+                )
+                SELECT chk.id, chk.total_milhas, chk.total_custo, chk.cpm_snapshot, chk.created_at,
+                       chk.tipo, chk.periodo_referencia,
+                       d.qtd, d.milhas, d.custo, d.min_dt, d.max_dt, d.ajustes
+                FROM (
+                    SELECT COUNT(*) AS qtd,
+                           COALESCE(SUM(milhas_creditadas), 0) AS milhas,
+                           COALESCE(SUM(custo_total), 0) AS custo,
+                           MIN(data_transacao) AS min_dt,
+                           MAX(data_transacao) AS max_dt,
+                           COUNT(*) FILTER (WHERE modo_aquisicao = 'AJUSTE_CPM') AS ajustes
+                    -- HOT PATH: usa idx_transactions_acc_prog_created (index-only scan)
+                    FROM transactions
+                    WHERE account_id = %(acc_id)s AND companhia_referencia_id = %(prog_id)s
+                      AND created_at > COALESCE((SELECT created_at FROM chk), '-infinity')
+                ) d
+                LEFT JOIN chk ON TRUE
+            """, {"acc_id": acc_id, "prog_id": prog_id})
             row = cur.fetchone()
-            if row:
-                checkpoint = {
-                    "id": row[0], "total_milhas": row[1], "total_custo": float(row[2]),
-                    "cpm_snapshot": float(row[3]), "created_at": row[4],
-                    "tipo": row[5], "periodo_referencia": row[6],
-                }
 
-            # Filtra apenas as transações posteriores ao checkpoint (se existir),
-            # evitando reprocessar o histórico já consolidado no snapshot.
-            cutoff = checkpoint["created_at"] if checkpoint else None
-            if cutoff:
-                cur.execute("""
-                    SELECT COUNT(*),
-                           COALESCE(SUM(milhas_creditadas), 0),
-                           COALESCE(SUM(custo_total), 0),
-                           MIN(data_transacao),
-                           MAX(data_transacao),
-                           COUNT(*) FILTER (WHERE modo_aquisicao = 'AJUSTE_CPM')
-                    FROM transactions
-                    WHERE account_id = %s AND companhia_referencia_id = %s
-                      AND created_at > %s
-                """, (acc_id, prog_id, cutoff))
-            else:
-                cur.execute("""
-                    SELECT COUNT(*),
-                           COALESCE(SUM(milhas_creditadas), 0),
-                           COALESCE(SUM(custo_total), 0),
-                           MIN(data_transacao),
-                           MAX(data_transacao),
-                           COUNT(*) FILTER (WHERE modo_aquisicao = 'AJUSTE_CPM')
-                    FROM transactions
-                    WHERE account_id = %s AND companhia_referencia_id = %s
-                """, (acc_id, prog_id))
-            delta = cur.fetchone() or (0, 0, 0.0, None, None, 0)
+        checkpoint = None
+        if row and row[0] is not None:
+            checkpoint = {
+                "id": row[0], "total_milhas": row[1], "total_custo": row[2],
+                "cpm_snapshot": row[3], "created_at": row[4],  # Decimal: só exibição
+                "tipo": row[5], "periodo_referencia": row[6],
+            }
+        delta = tuple(row[7:]) if row else (0, 0, Decimal(0), None, None, 0)
 
         base_milhas = checkpoint["total_milhas"] if checkpoint else 0
-        base_custo  = checkpoint["total_custo"]  if checkpoint else 0.0
+        base_custo  = checkpoint["total_custo"]  if checkpoint else Decimal(0)
         total_milhas = base_milhas + int(delta[1] or 0)
-        total_custo  = base_custo  + float(delta[2] or 0)
+        total_custo  = base_custo  + (delta[2] or Decimal(0))
         return total_milhas, total_custo, checkpoint, delta
 
     def _build_checkpoint_descricao(
@@ -1198,8 +1572,9 @@ class DatabaseManager(Toolkit):
     ) -> str:
         """Gera a descrição automática do checkpoint conforme o tipo."""
         if tipo == "MENSAL":
-            ano, mes = map(int, (periodo_referencia or "").split("-"))
-            return f"Fechamento {_MESES_PT[mes]}/{ano} — {programa_nome}"
+            # Só o mês vira int (índice); o ano é exibido como veio
+            ano, mes = (periodo_referencia or "").split("-")
+            return f"Fechamento {_MESES_PT[int(mes) - 1]}/{ano} — {programa_nome}"
         elif tipo == "AUTO":
             if tipo_ajuste == "CUSTO":
                 return f"[Auto] Pós-ajuste de custo: {(valor_ajuste or 0):+.2f} — {programa_nome}"
@@ -1208,42 +1583,6 @@ class DatabaseManager(Toolkit):
         else:
             return f"Confirmação de CPM — {programa_nome}"
 
-    def _insert_cpm_checkpoint(
-        self, conn: psycopg.Connection,
-        acc_id: str, prog_id: str, programa_nome: str,
-        tipo: str, total_milhas: int, total_custo: float, delta: Optional[tuple],
-        periodo_referencia: Optional[str] = None,
-        observacao: Optional[str] = None,
-        tipo_ajuste: Optional[str] = None,
-        valor_ajuste: Optional[float] = None,
-    ) -> str:
-        """
-        Insere em cpm_checkpoints. Não faz commit — responsabilidade do chamador.
-        Retorna o id do checkpoint criado.
-        """
-        cpm_snapshot = round(total_custo / total_milhas * 1000, 2) if total_milhas > 0 else 0.0
-        descricao = self._build_checkpoint_descricao(
-            tipo, programa_nome, periodo_referencia, tipo_ajuste, valor_ajuste
-        )
-        delta_inicio = delta[3] if delta else None
-        delta_fim    = delta[4] if delta else None
-
-        with conn.cursor() as cur:
-            cur.execute("""
-                INSERT INTO cpm_checkpoints
-                (account_id, programa_id, data_checkpoint, total_milhas, total_custo,
-                 cpm_snapshot, tipo, periodo_referencia, delta_data_inicio, delta_data_fim,
-                 descricao, observacao)
-                VALUES (%s, %s, CURRENT_DATE, %s, %s, %s, %s, %s, %s, %s, %s, %s)
-                RETURNING id
-            """, (
-                acc_id, prog_id, total_milhas, total_custo, cpm_snapshot,
-                tipo, periodo_referencia, delta_inicio, delta_fim,
-                descricao, observacao,
-            ))
-            row = cur.fetchone()
-            return str(row[0]) if row else ""
-
     # ── Protocolo de CPM: ferramentas públicas ───────────────────────────────
 
     @log_tool_call
@@ -1281,63 +1620,51 @@ class DatabaseManager(Toolkit):
                     return f"❌ Não é possível fechar um mês futuro ({periodo_referencia})."
 
             with self._get_conn() as conn:
-                acc_id, acc_nome = self._get_account_id(conn, nome_conta)
+                acc_id, acc_nome, prog_id = self._resolve_account_and_program(conn, nome_conta, nome_programa)
                 if not acc_id:
                     return f"❌ Conta '{nome_conta}' não encontrada."
-                prog_id = self._get_program_id(conn, nome_programa)
                 if not prog_id:
                     return f"❌ Programa '{nome_programa}' não encontrado."
 
-                if tipo == "MENSAL":
-                    with conn.cursor() as cur:
-                        cur.execute("""
-                            SELECT id FROM cpm_checkpoints
-                            WHERE account_id = %s AND programa_id = %s
-                              AND periodo_referencia = %s
-                        """, (acc_id, prog_id, periodo_referencia))
-                        if cur.fetchone():
-                            ano, mes = map(int, (periodo_referencia or "").split("-"))
-                            return (
-                                f"⛔ {_MESES_PT[mes].capitalize()}/{ano} já foi fechado para "
-                                f"{nome_programa} / {acc_nome}. Não é possível duplicar o fechamento."
-                            )
-
-                total_milhas, total_custo, _, delta = self._get_cpm_totals(conn, acc_id, prog_id)
-                if total_milhas <= 0:
-                    return f"❌ Nenhuma transação encontrada para {nome_programa} / {acc_nome}."
-
-                try:
-                    self._insert_cpm_checkpoint(
-                        conn, acc_id, prog_id, nome_programa,
-                        tipo, total_milhas, total_custo, delta,
-                        periodo_referencia=periodo_referencia,
-                        observacao=observacao,
-                    )
+                # Totais + INSERT do checkpoint numa instrução; pipeline: + COMMIT na
+                # mesma rajada (1 round-trip). Se nada foi gravado, o COMMIT é inócuo.
+                with conn.pipeline(), conn.cursor() as cur:
+                    cur.execute(_SQL_CONFIRM_CPM_CHECKPOINT, {
+                        "acc_id": acc_id, "prog_id": prog_id,
+                        "tipo": tipo, "periodo": periodo_referencia,
+                        "descricao": self._build_checkpoint_descricao(
+                            tipo, nome_programa, periodo_referencia
+                        ),
+                        "observacao": observacao,
+                    })
                     conn.commit()
-                except psycopg.errors.UniqueViolation:
-                    conn.rollback()
-                    ano_dup, mes_dup = map(int, (periodo_referencia or "").split("-"))
-                    return (
-                        f"⛔ {_MESES_PT[mes_dup].capitalize()}/{ano_dup} já foi fechado para "
-                        f"{nome_programa} / {acc_nome}. Não é possível duplicar o fechamento."
-                    )
-
-                cpm = round(total_custo / total_milhas * 1000, 2)
-                tag = f"[Fechamento: {periodo_referencia}]" if tipo == "MENSAL" else f"[{tipo}]"
-                periodo_txt = ""
-                if delta and delta[3] and delta[4]:
-                    dt_ini, dt_fim = delta[3], delta[4]
-                    periodo_txt = f"\n   Período coberto: {dt_ini.strftime('%d/%m')} a {dt_fim.strftime('%d/%m/%Y')}"
+                    total_milhas, total_custo, dt_ini, dt_fim, chk_id = cur.fetchone()
 
+            if total_milhas <= 0:
+                return f"❌ Nenhuma transação encontrada para {nome_programa} / {acc_nome}."
+            # Fechamento já existente: o índice único descartou o INSERT (sem id)
+            if not chk_id:
+                ano_dup, mes_dup = map(int, (periodo_referencia or "").split("-"))
                 return (
-                    f"✅ Checkpoint de CPM registrado! {tag}\n"
-                    f"📊 {nome_programa} / {acc_nome} — {date.today().strftime('%d/%m/%Y')}"
-                    f"{periodo_txt}\n"
-                    f"   Total acumulado: {total_milhas:,} milhas | R$ {total_custo:,.2f}\n"
-                    f"   **CPM confirmado: R$ {cpm:.2f}**\n\n"
-                    f"ℹ️ Próximas reconciliações partirão deste ponto."
+                    f"⛔ {_MESES_CAP[mes_dup - 1]}/{ano_dup} já foi fechado para "
+                    f"{nome_programa} / {acc_nome}. Não é possível duplicar o fechamento."
                 )
 
+            cpm = _cpm_centavos(total_custo, total_milhas)
+            tag = f"[Fechamento: {periodo_referencia}]" if tipo == "MENSAL" else f"[{tipo}]"
+            periodo_txt = ""
+            if dt_ini and dt_fim:
+                periodo_txt = f"\n   Período coberto: {dt_ini.strftime('%d/%m')} a {format_date_br(dt_fim)}"
+
+            return (
+                f"✅ Checkpoint de CPM registrado! {tag}\n"
+                f"📊 {nome_programa} / {acc_nome} — {format_date_br(date.today())}"
+                f"{periodo_txt}\n"
+                f"   Total acumulado: {total_milhas:,} milhas | R$ {total_custo:,.2f}\n"
+                f"   **CPM confirmado: R$ {cpm:.2f}**\n\n"
+                f"ℹ️ Próximas reconciliações partirão deste ponto."
+            )
+
         except Exception as e:
             return _sanitize_error("confirm_cpm_checkpoint", e)
 
@@ -1350,10 +1677,9 @@ class DatabaseManager(Toolkit):
         """
         try:
             with self._get_conn() as conn:
-                acc_id, acc_nome = self._get_account_id(conn, nome_conta)
+                acc_id, acc_nome, prog_id = self._resolve_account_and_program(conn, nome_conta, nome_programa)
                 if not acc_id:
                     return f"❌ Conta '{nome_conta}' não encontrada."
-                prog_id = self._get_program_id(conn, nome_programa)
                 if not prog_id:
                     return f"❌ Programa '{nome_programa}' não encontrado."
 
@@ -1364,26 +1690,26 @@ class DatabaseManager(Toolkit):
             if total_milhas <= 0:
                 return f"❌ Nenhuma transação encontrada para {nome_programa} / {acc_nome}."
 
-            cpm_atual = round(total_custo / total_milhas * 1000, 2)
+            cpm_atual = _cpm_centavos(total_custo, total_milhas)
             delta_count    = int(delta[0] or 0)
             delta_milhas   = int(delta[1] or 0)
-            delta_custo    = float(delta[2] or 0)
+            delta_custo    = delta[2] or Decimal(0)
             delta_ajustes  = int(delta[5] or 0)
 
             if checkpoint:
-                chk_data = checkpoint["created_at"].strftime("%d/%m/%Y")
+                chk_data = format_date_br(checkpoint["created_at"])
                 chk_tipo = checkpoint["tipo"]
                 chk_cpm  = checkpoint["cpm_snapshot"]
-                chk_ref  = f" ({checkpoint['periodo_referencia']})" if checkpoint["periodo_referencia"] else f" ({chk_tipo})"
+                chk_ref  = _checkpoint_ref_txt(chk_tipo, checkpoint["periodo_referencia"])
                 chk_line = f"Último checkpoint: {chk_data}{chk_ref} — CPM confirmado: **R$ {chk_cpm:.2f}**"
             else:
                 chk_line = "Sem checkpoint anterior — análise de todo o histórico"
 
             ajuste_line = f"\n  Ajustes de CPM aplicados: {delta_ajustes}" if delta_ajustes > 0 else ""
             aviso_volume = ""
-            if delta_count > 10:
+            if delta_count > _LIMITE_TX_SEM_CHECKPOINT:
                 aviso_volume = (
-                    f"\n\n📌 Há {delta_count} transações sem checkpoint (limite: 10). "
+                    f"\n\n📌 Há {delta_count} transações sem checkpoint (limite: {_LIMITE_TX_SEM_CHECKPOINT}). "
                     "Se o CPM estiver correto, posso confirmar agora para agilizar futuras reconciliações."
                 )
 
@@ -1415,10 +1741,9 @@ class DatabaseManager(Toolkit):
         """
         try:
             with self._get_conn() as conn:
-                acc_id, acc_nome = self._get_account_id(conn, nome_conta)
+                acc_id, acc_nome, prog_id = self._resolve_account_and_program(conn, nome_conta, nome_programa)
                 if not acc_id:
                     return f"❌ Conta '{nome_conta}' não encontrada."
-                prog_id = self._get_program_id(conn, nome_programa)
                 if not prog_id:
                     return f"❌ Programa '{nome_programa}' não encontrado."
 
@@ -1427,19 +1752,23 @@ class DatabaseManager(Toolkit):
             if total_milhas <= 0:
                 return f"❌ Nenhuma transação encontrada para {nome_programa} / {acc_nome}."
 
-            cpm_atual = round(total_custo / total_milhas * 1000, 2)
+            cpm_atual = _cpm_centavos(total_custo, total_milhas)
 
-            if abs(cpm_atual - cpm_alvo) < 0.01:
+            # Comparação em centavos exatos (sem epsilon de float)
+            alvo = Decimal(str(cpm_alvo)).quantize(_CENTAVO, ROUND_HALF_UP)
+            if alvo <= 0:
+                return "❌ cpm_alvo deve ser maior que zero."
+            if cpm_atual == alvo:
                 return (
                     f"✅ O CPM atual de {nome_programa} / {acc_nome} já é **R$ {cpm_atual:.2f}** "
                     "— nenhum ajuste necessário."
                 )
 
             # Opção A: ajuste de custo (milhas não mudam)
-            delta_custo = round(cpm_alvo * total_milhas / 1000 - total_custo, 2)
+            delta_custo = (alvo * total_milhas / 1000 - total_custo).quantize(_CENTAVO, ROUND_HALF_UP)
 
             linhas = [
-                f"🎯 Para atingir CPM de **R$ {cpm_alvo:.2f}** (atual: R$ {cpm_atual:.2f}) "
+                f"🎯 Para atingir CPM de **R$ {alvo:.2f}** (atual: R$ {cpm_atual:.2f}) "
                 f"— {nome_programa} / {acc_nome}:\n",
                 f"Opção A — Ajuste de custo:",
                 f"  {'Reduzir' if delta_custo < 0 else 'Adicionar'} R$ {abs(delta_custo):.2f} no custo registrado",
@@ -1447,8 +1776,8 @@ class DatabaseManager(Toolkit):
             ]
 
             # Opção B: adicionar milhas (só faz sentido se cpm_alvo < cpm_atual)
-            if cpm_alvo < cpm_atual:
-                delta_milhas = round(total_custo / cpm_alvo * 1000 - total_milhas)
+            if alvo < cpm_atual:
+                delta_milhas = round(total_custo / alvo * 1000 - total_milhas)
                 linhas += [
                     f"Opção B — Crédito de milhas grátis:",
                     f"  Adicionar {delta_milhas:,} milhas sem custo",
@@ -1490,61 +1819,50 @@ class DatabaseManager(Toolkit):
             if tipo_ajuste == "MILHAS" and (valor < 0 or not float(valor).is_integer()):
                 return "❌ Para tipo_ajuste='MILHAS', valor deve ser inteiro positivo."
 
+            if tipo_ajuste == "CUSTO":
+                milhas_credit = 0
+                # Decimal(str()) converte o float recebido uma única vez, sem ruído binário
+                custo = Decimal(str(valor))
+                descricao_tx = f"Ajuste de CPM: correção de custo ({valor:+.2f})"
+            else:
+                milhas_credit = int(valor)
+                custo = Decimal(0)
+                descricao_tx = f"Ajuste de CPM: crédito de {int(valor):,} milhas sem custo"
+
             with self._get_conn() as conn:
-                acc_id, acc_nome = self._get_account_id(conn, nome_conta)
+                acc_id, acc_nome, prog_id = self._resolve_account_and_program(conn, nome_conta, nome_programa)
                 if not acc_id:
                     return f"❌ Conta '{nome_conta}' não encontrada."
-                prog_id = self._get_program_id(conn, nome_programa)
                 if not prog_id:
                     return f"❌ Programa '{nome_programa}' não encontrado."
 
-                if tipo_ajuste == "CUSTO":
-                    _, total_custo_pre, _, _ = self._get_cpm_totals(conn, acc_id, prog_id)
-                    custo_resultante = total_custo_pre + float(valor)
-                    if custo_resultante < 0:
-                        return (
-                            f"❌ Ajuste inválido: o valor informado tornaria o custo total negativo "
-                            f"(resultado seria R$ {custo_resultante:,.2f}). "
-                            f"Consulte primeiro o cálculo de ajuste para obter o valor correto."
-                        )
-                    milhas_base = milhas_credit = 0
-                    custo = float(valor)
-                    descricao_tx = f"Ajuste de CPM: correção de custo ({valor:+.2f})"
-                else:
-                    milhas_base = milhas_credit = int(valor)
-                    custo = 0.0
-                    descricao_tx = f"Ajuste de CPM: crédito de {int(valor):,} milhas sem custo"
-
-                with conn.cursor() as cur:
-                    cur.execute("""
-                        INSERT INTO transactions
-                        (account_id, data_registro, data_transacao, modo_aquisicao,
-                         origem_id, destino_id, companhia_referencia_id,
-                         milhas_base, bonus_percent, milhas_creditadas,
-                         custo_total, cpm_real, descricao, observacao)
-                        VALUES (%s, CURRENT_DATE, CURRENT_DATE, 'AJUSTE_CPM',
-                                NULL, %s, %s,
-                                %s, 0, %s,
-                                %s, 0, %s, %s)
-                    """, (
-                        acc_id, prog_id, prog_id,
-                        milhas_base, milhas_credit,
-                        custo, descricao_tx, observacao,
-                    ))
-
-                # Checkpoint AUTO criado imediatamente após o ajuste, na mesma transação de banco.
-                # Isso garante que reconciliações futuras partam do estado pós-ajuste,
+                # Totais + transação de ajuste + checkpoint AUTO numa instrução; pipeline:
+                # + COMMIT na mesma rajada (1 round-trip). O checkpoint criado junto com o
+                # ajuste garante que reconciliações futuras partam do estado pós-ajuste,
                 # sem reprocessar o delta antigo que motivou o ajuste.
-                total_milhas, total_custo, _, delta = self._get_cpm_totals(conn, acc_id, prog_id)
-                self._insert_cpm_checkpoint(
-                    conn, acc_id, prog_id, nome_programa,
-                    "AUTO", total_milhas, total_custo, delta,
-                    tipo_ajuste=tipo_ajuste, valor_ajuste=float(valor),
-                    observacao=observacao,
+                with conn.pipeline(), conn.cursor() as cur:
+                    cur.execute(_SQL_APPLY_CPM_ADJUSTMENT, {
+                        "acc_id": acc_id, "prog_id": prog_id,
+                        "modo": ModoAquisicao.AJUSTE_CPM.value,
+                        "milhas": milhas_credit, "custo": custo,
+                        "descricao_tx": descricao_tx, "observacao": observacao,
+                        "descricao_chk": self._build_checkpoint_descricao(
+                            "AUTO", nome_programa, tipo_ajuste=tipo_ajuste, valor_ajuste=float(valor)
+                        ),
+                    })
+                    conn.commit()
+                    total_milhas_pre, total_custo_pre, aplicado = cur.fetchone()
+
+            total_milhas = total_milhas_pre + milhas_credit
+            total_custo = total_custo_pre + custo
+            if not aplicado:
+                return (
+                    f"❌ Ajuste inválido: o valor informado tornaria o custo total negativo "
+                    f"(resultado seria R$ {total_custo:,.2f}). "
+                    f"Consulte primeiro o cálculo de ajuste para obter o valor correto."
                 )
-                conn.commit()
 
-            cpm_novo = round(total_custo / total_milhas * 1000, 2) if total_milhas > 0 else 0.0
+            cpm_novo = _cpm_centavos(total_custo, total_milhas) if total_milhas > 0 else Decimal(0)
             if tipo_ajuste == "CUSTO":
                 detalhe = f"custo {'reduzido' if valor < 0 else 'adicionado'} em R$ {abs(valor):.2f}"
             else:
@@ -1575,81 +1893,96 @@ class DatabaseManager(Toolkit):
                 if not acc_id:
                     return f"❌ Conta '{nome_conta}' não encontrada."
 
+                # Uma só consulta para todos os programas: último checkpoint, agregado das
+                # transações posteriores a ele (todas, se não houver) e fechamento do mês
+                # anterior — mesma lógica base + delta de _get_cpm_totals, por programa.
                 with conn.cursor() as cur:
                     cur.execute("""
-                        SELECT DISTINCT t.companhia_referencia_id, p.nome
-                        FROM transactions t
-                        JOIN programs p ON p.id = t.companhia_referencia_id
-                        WHERE t.account_id = %s
+                        SELECT p.nome,
+                               chk.total_milhas, chk.total_custo, chk.created_at,
+                               chk.tipo, chk.periodo_referencia,
+                               d.qtd, d.milhas, d.custo,
+                               EXISTS (
+                                   SELECT 1 FROM cpm_checkpoints m
+                                   WHERE m.account_id = %(acc_id)s AND m.programa_id = p.id
+                                     AND m.periodo_referencia = %(mes_anterior)s
+                               ) AS tem_mensal
+                        FROM programs p
+                        LEFT JOIN LATERAL (
+                            SELECT total_milhas, total_custo, created_at, tipo, periodo_referencia
+                            FROM cpm_checkpoints
+                            WHERE account_id = %(acc_id)s AND programa_id = p.id
+                            ORDER BY created_at DESC
+                            LIMIT 1
+                        ) chk ON TRUE
+                        CROSS JOIN LATERAL (
+                            SELECT COUNT(*) AS qtd,
+                                   COALESCE(SUM(milhas_creditadas), 0) AS milhas,
+                                   COALESCE(SUM(custo_total), 0) AS custo
+                            -- HOT PATH: usa idx_transactions_acc_prog_created (index-only scan)
+                            FROM transactions t
+                            WHERE t.account_id = %(acc_id)s AND t.companhia_referencia_id = p.id
+                              AND t.created_at > COALESCE(chk.created_at, '-infinity')
+                        ) d
+                        -- Programas usados pela conta: semi-join (1 sonda no índice por
+                        -- programa) em vez de DISTINCT sobre todas as transações da conta
+                        WHERE EXISTS (
+                            SELECT 1 FROM transactions t
+                            WHERE t.account_id = %(acc_id)s AND t.companhia_referencia_id = p.id
+                        )
                         ORDER BY p.nome
-                    """, (acc_id,))
+                    """, {"acc_id": acc_id, "mes_anterior": mes_anterior})
                     programas = cur.fetchall()
 
-                if not programas:
-                    return f"❌ Nenhuma transação encontrada para {acc_nome}."
+            # Resposta montada após devolver a conexão ao pool
+            if not programas:
+                return f"❌ Nenhuma transação encontrada para {acc_nome}."
 
-                linhas = []
-                total_geral = 0
-                alertas = []
+            linhas = []
+            total_geral = 0
+            alertas = []
 
-                for prog_id, prog_nome in programas:
-                    total_milhas, total_custo, checkpoint, delta = self._get_cpm_totals(
-                        conn, acc_id, prog_id
-                    )
-                    if total_milhas <= 0:
-                        continue
-
-                    cpm = round(total_custo / total_milhas * 1000, 2)
-                    delta_count = int(delta[0] or 0)
-
-                    # Verifica fechamento mensal do mês anterior
-                    with conn.cursor() as cur:
-                        cur.execute("""
-                            SELECT id FROM cpm_checkpoints
-                            WHERE account_id = %s AND programa_id = %s
-                              AND periodo_referencia = %s
-                        """, (acc_id, prog_id, mes_anterior))
-                        tem_mensal = cur.fetchone() is not None
-
-                    # Status de saúde
-                    if not checkpoint:
-                        status = "🔴 SEM CHECKPOINT"
-                        alertas.append(prog_nome)
-                    elif not tem_mensal or delta_count > 10:
-                        status = "⚠️ ALERTA"
-                        alertas.append(prog_nome)
-                    else:
-                        status = "✅ OK"
-
-                    # Fechamento mais recente
-                    if checkpoint and checkpoint["periodo_referencia"]:
-                        ano, mes = map(int, checkpoint["periodo_referencia"].split("-"))
-                        fech = f"{_MESES_PT[mes].capitalize()[:3]}/{ano}"
-                    elif checkpoint:
-                        fech = checkpoint["created_at"].strftime("%d/%m") + f" ({checkpoint['tipo']})"
-                    else:
-                        fech = "—"
-
-                    total_geral += total_milhas
-                    linhas.append(
-                        f"{prog_nome:<12} {total_milhas:>9,} mi   R$ {cpm:>6.2f}   "
-                        f"{fech:<14} {delta_count:>4} tx   {status}"
-                    )
+            for (prog_nome, chk_milhas, chk_custo, chk_created_at, chk_tipo, chk_periodo,
+                 delta_count, delta_milhas, delta_custo, tem_mensal) in programas:
+                total_milhas = (chk_milhas or 0) + int(delta_milhas)
+                total_custo = (chk_custo or Decimal(0)) + delta_custo
+                if total_milhas <= 0:
+                    continue
+
+                cpm = _cpm_centavos(total_custo, total_milhas)
+                tem_checkpoint = chk_created_at is not None
+
+                # Status de saúde
+                if not tem_checkpoint:
+                    status = "🔴 SEM CHECKPOINT"
+                    alertas.append(prog_nome)
+                elif not tem_mensal or delta_count > _LIMITE_TX_SEM_CHECKPOINT:
+                    status = "⚠️ ALERTA"
+                    alertas.append(prog_nome)
+                else:
+                    status = "✅ OK"
+
+                # Fechamento mais recente
+                if chk_periodo:
+                    ano, mes = map(int, chk_periodo.split("-"))
+                    fech = f"{_MESES_CAP3[mes - 1]}/{ano}"
+                elif tem_checkpoint:
+                    fech = chk_created_at.strftime("%d/%m") + f" ({chk_tipo})"
+                else:
+                    fech = "—"
 
-            cabecalho = (
-                f"📊 Panorama — {acc_nome}\n"
-                f"{'─' * 72}\n"
-                f"{'Programa':<12} {'Milhas':>12}   {'CPM':>9}   {'Fechamento':<14} {'s/chk':>5}   Status\n"
-                f"{'─' * 72}"
-            )
-            rodape = (
-                f"{'─' * 72}\n"
-                f"Total: {total_geral:,} milhas em {len(linhas)} programa(s)"
-            )
+                total_geral += total_milhas
+                linhas.append(
+                    f"{prog_nome:<12} {total_milhas:>9,} mi   R$ {cpm:>6.2f}   "
+                    f"{fech:<14} {delta_count:>4} tx   {status}"
+                )
+
+            rodape = f"{_PANORAMA_SEP}\nTotal: {total_geral:,} milhas em {len(linhas)} programa(s)"
+            partes = [f"📊 Panorama — {acc_nome}", _PANORAMA_COLUNAS, *linhas, rodape]
             if alertas:
-                rodape += f"\n⚠️ Atenção necessária: {', '.join(alertas)}"
+                partes.append(f"⚠️ Atenção necessária: {', '.join(alertas)}")
 
-            return "\n".join([cabecalho] + linhas + [rodape])
+            return "\n".join(partes)
 
         except Exception as e:
             return _sanitize_error("get_client_panorama", e)
\ No newline at end of file
@@ -0,0 +1,8 @@
+"""Configuração comum dos testes."""
+import os
+
+# app.config.settings instancia Settings() no import e exige estas credenciais;
+# sem .env, a coleta dos testes falharia. Valores fictícios: nenhum teste acessa
+# OpenAI, banco ou Slack de verdade.
+for _var in ("OPENAI_API_KEY", "DATABASE_URL", "SLACK_BOT_TOKEN", "SLACK_SIGNING_SECRET"):
+    os.environ.setdefault(_var, "test")
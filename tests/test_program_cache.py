@@ -0,0 +1,81 @@
+"""Cache de lookup de programas do DatabaseManager (sem banco: conexão falsa)."""
+import pytest
+
+pytest.importorskip("psycopg")
+pytest.importorskip("agno")
+
+from app.tools.db_toolkit import DatabaseManager  # noqa: E402
+
+_PROGRAMAS = {"Smiles": "prog-smiles"}
+
+
+class _FakeCursor:
+    def __init__(self, conn):
+        self._conn = conn
+        self._rows = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def execute(self, sql, params):
+        # Emula o ILIKE do _SQL_LOOKUP_PROGRAMS: devolve (nome enviado, id) dos achados
+        self._conn.enviados.append(list(params["prog_nomes"]))
+        self._rows = [
+            (nome, prog_id)
+            for nome in params["prog_nomes"]
+            for cadastrado, prog_id in _PROGRAMAS.items()
+            if nome.lower() in cadastrado.lower()
+        ]
+
+    def fetchall(self):
+        return self._rows
+
+
+class _FakeConn:
+    def __init__(self):
+        self.enviados = []
+
+    def cursor(self):
+        return _FakeCursor(self)
+
+
+@pytest.fixture
+def manager():
+    # Sem __init__: não abre o pool de conexões
+    mgr = DatabaseManager.__new__(DatabaseManager)
+    mgr._program_cache = {}
+    mgr._account_cache = {}
+    return mgr
+
+
+def test_nome_com_espacos_vai_ao_banco_normalizado(manager):
+    conn = _FakeConn()
+    encontrados, faltantes = manager._cached_program_ids(["Smiles "])
+    resultado = manager._fetch_program_ids(conn, faltantes, encontrados)
+
+    assert conn.enviados == [["Smiles"]]
+    assert resultado == {"Smiles ": "prog-smiles"}
+
+
+def test_nome_com_espacos_nao_gera_cache_negativo(manager):
+    conn = _FakeConn()
+    encontrados, faltantes = manager._cached_program_ids(["Smiles "])
+    manager._fetch_program_ids(conn, faltantes, encontrados)
+
+    # Variações do mesmo nome saem do cache (positivo), sem nova ida ao banco
+    encontrados, faltantes = manager._cached_program_ids(["smiles", " SMILES"])
+    assert faltantes == {}
+    assert encontrados == {"smiles": "prog-smiles", " SMILES": "prog-smiles"}
+    assert len(conn.enviados) == 1
+
+
+def test_nao_encontrado_fica_em_cache_negativo(manager):
+    conn = _FakeConn()
+    encontrados, faltantes = manager._cached_program_ids([" Latam "])
+    assert manager._fetch_program_ids(conn, faltantes, encontrados) == {}
+
+    encontrados, faltantes = manager._cached_program_ids(["latam"])
+    assert (encontrados, faltantes) == ({}, {})